@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
 from app.schemas.student import StudentBase
 from app.utils.fingerprint import enroll_fingerprint
-from app.utils.multi_device_fingerprint import enroll_fingerprint_multi_device, device_manager, delete_student_from_all_devices
+from app.utils.multi_device_fingerprint import enroll_fingerprint_multi_device_async, device_manager, delete_student_from_all_devices
 from app.utils.fingerprint import connect_device
 from app.dependencies.auth import get_current_assistant
 from app.models.student import Student
@@ -99,7 +99,7 @@ async def register_student_with_fingerprint(
     print(f"🔍 Starting fingerprint enrollment for {data.first_name} {data.last_name} (UID: {uid})")
     
     # First attempt at enrollment
-    enrollment_result = enroll_fingerprint_multi_device(uid, f"{data.first_name}_{data.last_name}", device_manager)
+    enrollment_result = await enroll_fingerprint_multi_device_async(uid, f"{data.first_name}_{data.last_name}", device_manager)
     
     # If enrollment failed, check if it's due to user already existing
     if not enrollment_result["success"]:
@@ -117,7 +117,7 @@ async def register_student_with_fingerprint(
                 print(f"🔄 Retrying enrollment after deletion...")
                 
                 # Retry enrollment after deletion
-                enrollment_result = enroll_fingerprint_multi_device(uid, f"{data.first_name}_{data.last_name}", device_manager)
+                enrollment_result = await enroll_fingerprint_multi_device_async(uid, f"{data.first_name}_{data.last_name}", device_manager)
                 
                 if enrollment_result["success"]:
                     print(f"✅ Enrollment successful after deletion and retry!")
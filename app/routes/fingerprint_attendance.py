@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Query, Depends, Request
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Query, Depends, Request, Response
 from pydantic import BaseModel
 from app.utils.fingerprint import connect_device
 from app.dependencies.auth import get_current_assistant
@@ -599,8 +599,7 @@ async def capture_from_device(device: DeviceInfo):
     
     except Exception as e:
         print(f"❌ Device {device.name} attendance error: {e}")
-        device.status = "error"
-        device.error_message = str(e)
+        device_manager.mark_device_error(device, str(e))
     
     finally:
         print(f"⚠️ Device {device.name} fingerprint capture ended")
@@ -981,12 +980,12 @@ async def get_attendance_status(assistant=Depends(get_current_assistant)):
 @router.get("/devices")
 async def get_all_devices(assistant=Depends(get_current_assistant)):
     """Get information about all configured devices"""
-    devices_status = device_manager.get_device_status()
-    return {
-        "total_devices": len(devices_status),
-        "enabled_devices": len(device_manager.get_enabled_devices()),
-        "devices": devices_status
-    }
+    body = b'{"total_devices":%d,"enabled_devices":%d,"devices":%s}' % (
+        len(device_manager.get_all_devices()),
+        len(device_manager.get_enabled_devices()),
+        device_manager.get_status_json_bytes()
+    )
+    return Response(content=body, media_type="application/json")
 
 
 @router.get("/devices/{device_id}")
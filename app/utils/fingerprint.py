@@ -89,7 +89,7 @@ def enroll_fingerprint(uid: int, name: str):
             raise AttributeError("❌ Unsupported fingerprint template format")
 
         # Encode to base64
-        encoded_template = base64.b64encode(raw).decode()
+        encoded_template = base64.b64encode(raw).decode("ascii")
         print("✅ Fingerprint enrolled and encoded successfully")
         return encoded_template
 
@@ -0,0 +1,41 @@
+import logging
+import logging.handlers
+import queue
+from typing import Optional
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# Loggers the server prints: the app's own, plus the top-level scanner
+# modules the correction routes drive
+LOGGER_NAMES = ("fingerprint", "scanner", "scanner_fallback")
+
+
+def setup_logging(level: int = logging.INFO) -> logging.handlers.QueueListener:
+    """Route the LOGGER_NAMES loggers through a queue so stream I/O happens
+    on a background thread instead of the event loop thread."""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    for name in LOGGER_NAMES:
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        logger.addHandler(queue_handler)
+        logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def shutdown_logging():
+    """Flush pending records and stop the background listener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -73,7 +73,7 @@ def detect_exam_model(image_path: str) -> Dict[str, Any]:
         circles = np.round(circles[0, :]).astype("int")
         
         # Sort circles by x-coordinate (left to right)
-        circles = sorted(circles, key=lambda c: c[0])
+        circles = circles[np.argsort(circles[:, 0], kind="stable")]
         
         if len(circles) < 3:
             return {
@@ -88,10 +88,15 @@ def detect_exam_model(image_path: str) -> Dict[str, Any]:
         
         # Check which circle is filled by analyzing the darkness inside each circle
         model_scores = []
+        # One mask for all circles; only the previous disc is erased between circles
+        mask = np.zeros(roi.shape, dtype=np.uint8)
+        last_circle = None
         for i, (x, y, r) in enumerate(model_circles):
-            # Create a mask for the circle
-            mask = np.zeros(roi.shape, dtype=np.uint8)
+            # Draw the mask for this circle
+            if last_circle is not None:
+                cv2.circle(mask, last_circle[:2], last_circle[2], 0, -1)
             cv2.circle(mask, (x, y), r - 5, 255, -1)  # Slightly smaller radius to avoid edge effects
+            last_circle = (x, y, r - 5)
             
             # Calculate the mean intensity inside the circle
             # Lower values indicate darker (filled) circles
@@ -206,7 +211,7 @@ def detect_model_from_image_array(image: np.ndarray) -> Dict[str, Any]:
             }
         
         circles = np.round(circles[0, :]).astype("int")
-        circles = sorted(circles, key=lambda c: c[0])
+        circles = circles[np.argsort(circles[:, 0], kind="stable")]
         
         if len(circles) < 3:
             return {
@@ -219,10 +224,14 @@ def detect_model_from_image_array(image: np.ndarray) -> Dict[str, Any]:
         # Analyze first 3 circles
         model_circles = circles[:3]
         model_scores = []
+        mask = np.zeros(roi.shape, dtype=np.uint8)
+        last_circle = None
         
         for i, (x, y, r) in enumerate(model_circles):
-            mask = np.zeros(roi.shape, dtype=np.uint8)
+            if last_circle is not None:
+                cv2.circle(mask, last_circle[:2], last_circle[2], 0, -1)
             cv2.circle(mask, (x, y), r - 5, 255, -1)
+            last_circle = (x, y, r - 5)
             
             mean_intensity = cv2.mean(thresh, mask=mask)[0]
             fill_ratio = mean_intensity / 255.0
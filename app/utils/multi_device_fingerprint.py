@@ -1,13 +1,19 @@
 import json
 import os
 import asyncio
-from typing import Dict, List, Optional, Any
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Any, Tuple
 from datetime import datetime
 import base64
+import orjson
 from zk import ZK
 from dataclasses import dataclass
 from enum import Enum
 
+logger = logging.getLogger("fingerprint")
+
 
 class DeviceStatus(str, Enum):
     ONLINE = "online"
@@ -26,18 +32,32 @@ class DeviceInfo:
     enabled: bool
     status: DeviceStatus = DeviceStatus.OFFLINE
     connection: Optional[Any] = None
-    last_heartbeat: Optional[datetime] = None
+    last_heartbeat_wall: float = 0.0  # time.time(), for display only
     error_message: Optional[str] = None
+    fail_count: int = 0
+    backoff_until: float = 0.0  # time.monotonic() before which connects are skipped
 
 
 class MultiDeviceManager:
     def __init__(self, config_file: str = "devices_config.json"):
         self.config_file = config_file
         self.devices: Dict[str, DeviceInfo] = {}
+        self._device_list: Tuple[DeviceInfo, ...] = ()  # iteration order; devices is for id lookup
         self.capture_tasks: Dict[str, asyncio.Task] = {}
         self.is_running = False
+        self._status_json: Optional[bytes] = None
+        # Bumped on every state change; enrollment touches devices from a
+        # worker thread, so a snapshot is only cached if no change raced it
+        self._status_version = 0
+        self._status_lock = threading.Lock()
         self._load_device_config()
     
+    def _touch(self):
+        """Invalidate cached status snapshots after device state changes"""
+        with self._status_lock:
+            self._status_version += 1
+            self._status_json = None
+    
     def _load_device_config(self):
         """Load device configuration from JSON file"""
         try:
@@ -57,10 +77,10 @@ class MultiDeviceManager:
                 )
                 self.devices[device_info.device_id] = device_info
             
-            print(f"✅ Loaded {len(self.devices)} devices from config")
+            logger.info("✅ Loaded %s devices from config", len(self.devices))
             
         except FileNotFoundError:
-            print(f"⚠️ Config file {self.config_file} not found. Using default device.")
+            logger.warning("⚠️ Config file %s not found. Using default device.", self.config_file)
             # Fallback to single device for backward compatibility
             self.devices = {
                 "default": DeviceInfo(
@@ -73,12 +93,15 @@ class MultiDeviceManager:
                 )
             }
         except Exception as e:
-            print(f"❌ Error loading device config: {e}")
+            logger.error("❌ Error loading device config: %s", e)
             self.devices = {}
+        
+        self._device_list = tuple(self.devices.values())
+        self._touch()
     
     def get_enabled_devices(self) -> List[DeviceInfo]:
         """Get list of enabled devices"""
-        return [device for device in self.devices.values() if device.enabled]
+        return [device for device in self._device_list if device.enabled]
     
     def get_device(self, device_id: str) -> Optional[DeviceInfo]:
         """Get specific device by ID"""
@@ -91,8 +114,9 @@ class MultiDeviceManager:
     def connect_device(self, device: DeviceInfo) -> Optional[Any]:
         """Connect to a specific fingerprint device"""
         try:
-            print(f"🔌 Connecting to device {device.name} ({device.ip}:{device.port})")
+            logger.info("🔌 Connecting to device %s (%s:%s)", device.name, device.ip, device.port)
             device.status = DeviceStatus.CONNECTING
+            self._touch()
             
             zk = ZK(device.ip, port=device.port, timeout=5)
             conn = zk.connect()
@@ -100,22 +124,43 @@ class MultiDeviceManager:
             if conn:
                 device.connection = conn
                 device.status = DeviceStatus.ONLINE
-                device.last_heartbeat = datetime.now()
+                device.last_heartbeat_wall = time.time()
                 device.error_message = None
-                print(f"✅ Connected to device {device.name}")
+                device.fail_count = 0
+                device.backoff_until = 0.0
+                self._touch()
+                logger.info("✅ Connected to device %s", device.name)
                 return conn
             else:
                 device.status = DeviceStatus.ERROR
                 device.error_message = "Connection failed"
-                print(f"❌ Failed to connect to device {device.name}")
+                self._start_backoff(device)
+                logger.error("❌ Failed to connect to device %s", device.name)
                 return None
                 
         except Exception as e:
             device.status = DeviceStatus.ERROR
             device.error_message = str(e)
-            print(f"❌ Connection error for device {device.name}: {e}")
+            self._start_backoff(device)
+            logger.error("❌ Connection error for device %s: %s", device.name, e)
             return None
     
+    def _start_backoff(self, device: DeviceInfo):
+        """Back off exponentially (capped at 60s) after a failed connect"""
+        device.backoff_until = time.monotonic() + min(60, 2 ** device.fail_count)
+        device.fail_count += 1
+        self._touch()
+    
+    def mark_device_error(self, device: DeviceInfo, message: str):
+        """Record a runtime error reported by a device's capture task"""
+        device.status = DeviceStatus.ERROR
+        device.error_message = message
+        self._touch()
+    
+    def is_backing_off(self, device: DeviceInfo) -> bool:
+        """Check if a recently failed device should be skipped for now"""
+        return time.monotonic() < device.backoff_until
+    
     def disconnect_device(self, device: DeviceInfo):
         """Disconnect from a specific device"""
         try:
@@ -123,53 +168,65 @@ class MultiDeviceManager:
                 device.connection.disconnect()
                 device.connection = None
             device.status = DeviceStatus.OFFLINE
-            print(f"🔌 Disconnected from device {device.name}")
+            self._touch()
+            logger.info("🔌 Disconnected from device %s", device.name)
         except Exception as e:
-            print(f"⚠️ Error disconnecting from device {device.name}: {e}")
+            logger.warning("⚠️ Error disconnecting from device %s: %s", device.name, e)
     
     def connect_all_devices(self) -> Dict[str, bool]:
         """Connect to all enabled devices"""
         results = {}
         enabled_devices = self.get_enabled_devices()
         
-        print(f"🔌 Connecting to {len(enabled_devices)} devices...")
+        logger.info("🔌 Connecting to %s devices...", len(enabled_devices))
         
         for device in enabled_devices:
             conn = self.connect_device(device)
             results[device.device_id] = conn is not None
         
         connected_count = sum(results.values())
-        print(f"✅ Connected to {connected_count}/{len(enabled_devices)} devices")
+        logger.info("✅ Connected to %s/%s devices", connected_count, len(enabled_devices))
         
         return results
     
     def disconnect_all_devices(self):
         """Disconnect from all devices"""
-        for device in self.devices.values():
+        for device in self._device_list:
             if device.connection:
                 self.disconnect_device(device)
     
     def get_device_status(self) -> Dict[str, Dict]:
         """Get status of all devices"""
         status = {}
-        for device_id, device in self.devices.items():
-            status[device_id] = {
+        for device in self._device_list:
+            status[device.device_id] = {
                 "name": device.name,
                 "location": device.location,
                 "ip": device.ip,
                 "port": device.port,
                 "enabled": device.enabled,
                 "status": device.status,
-                "last_heartbeat": device.last_heartbeat.isoformat() if device.last_heartbeat else None,
+                "last_heartbeat": datetime.fromtimestamp(device.last_heartbeat_wall).isoformat() if device.last_heartbeat_wall else None,
                 "error_message": device.error_message,
                 "connected": device.connection is not None
             }
         return status
     
+    def get_status_json_bytes(self) -> bytes:
+        """Get get_device_status() pre-serialized as JSON, cached until state changes"""
+        status_json = self._status_json
+        if status_json is None:
+            version = self._status_version
+            status_json = orjson.dumps(self.get_device_status())
+            with self._status_lock:
+                if self._status_version == version:
+                    self._status_json = status_json
+        return status_json
+    
     async def start_all_capture_tasks(self, capture_function):
         """Start capture tasks for all enabled and connected devices (flexible: works with 1-6 devices)"""
         if self.is_running:
-            print("⚠️ Capture tasks already running")
+            logger.warning("⚠️ Capture tasks already running")
             return {"success": False, "message": "Already running"}
         
         enabled_devices = self.get_enabled_devices()
@@ -191,17 +248,17 @@ class MultiDeviceManager:
         self.is_running = True
         
         for device in connected_devices:
-            print(f"🚀 Starting capture task for device {device.name}")
+            logger.info("🚀 Starting capture task for device %s", device.name)
             task = asyncio.create_task(capture_function(device))
             self.capture_tasks[device.device_id] = task
         
         total_enabled = len(enabled_devices)
         connected_count = len(connected_devices)
         
-        print(f"✅ Started multi-device capture on {connected_count}/{total_enabled} devices")
+        logger.info("✅ Started multi-device capture on %s/%s devices", connected_count, total_enabled)
         if connected_count < total_enabled:
             failed_devices = [device.name for device in enabled_devices if not connection_results.get(device.device_id, False)]
-            print(f"⚠️ Could not connect to: {', '.join(failed_devices)}")
+            logger.warning("⚠️ Could not connect to: %s", ', '.join(failed_devices))
         
         return {
             "success": True,
@@ -229,13 +286,13 @@ class MultiDeviceManager:
                 except asyncio.CancelledError:
                     pass
                 cancelled_count += 1
-                print(f"🛑 Stopped capture task for device {device_id}")
+                logger.info("🛑 Stopped capture task for device %s", device_id)
         
         # Disconnect all devices
         self.disconnect_all_devices()
         self.capture_tasks = {}
         
-        print(f"✅ Stopped {cancelled_count} capture tasks and disconnected all devices")
+        logger.info("✅ Stopped %s capture tasks and disconnected all devices", cancelled_count)
         
         return {
             "success": True,
@@ -249,157 +306,172 @@ class MultiDeviceManager:
 
 
 # Multi-device enrollment functions
-def enroll_fingerprint_multi_device(uid: int, name: str, device_manager: MultiDeviceManager) -> Dict[str, Any]:
+def _try_enroll_on(device: DeviceInfo, uid: int, name: str, device_manager: MultiDeviceManager) -> Optional[Dict[str, Any]]:
     """
-    Enroll fingerprint on the first available device
-    Returns enrollment result with device info
+    Run the full enrollment sequence on a single device (blocking)
+    Returns the success result, or None if this device failed
     """
-    enabled_devices = device_manager.get_enabled_devices()
-    
-    if not enabled_devices:
-        return {
-            "success": False,
-            "error": "No enabled devices available",
-            "template": None,
-            "device_used": None
-        }
-    
-    # Try each device until one succeeds
-    for device in enabled_devices:
-        conn = device_manager.connect_device(device)
-        if not conn:
-            continue
-            
+    conn = device_manager.connect_device(device)
+    if not conn:
+        return None
+
+    try:
+        logger.info("🔍 Enrolling fingerprint for UID=%s, Name=%s on device %s", uid, name, device.name)
+        conn.disable_device()
+
+        # Delete user if exists (with enhanced error handling)
         try:
-            print(f"🔍 Enrolling fingerprint for UID={uid}, Name={name} on device {device.name}")
-            conn.disable_device()
+            users = conn.get_users()
+            user_exists = any(u.uid == uid for u in users)
+            if user_exists:
+                logger.warning("⚠️ User with UID=%s already exists on %s. Deleting first.", uid, device.name)
+                conn.delete_user(uid=uid)
+                logger.info("✅ Successfully deleted existing user UID=%s from %s", uid, device.name)
 
-            # Delete user if exists (with enhanced error handling)
+                # Verify deletion was successful
+                users_after = conn.get_users()
+                still_exists = any(u.uid == uid for u in users_after)
+                if still_exists:
+                    logger.warning("⚠️ User UID=%s still exists after deletion attempt on %s", uid, device.name)
+                    # Try deletion one more time with force
+                    try:
+                        conn.delete_user(uid=uid)
+                        logger.info("🔄 Forced deletion of UID=%s from %s", uid, device.name)
+                    except Exception as force_delete_err:
+                        logger.error("❌ Force deletion failed for UID=%s on %s: %s", uid, device.name, force_delete_err)
+                        return None  # Skip to next device
+                else:
+                    logger.info("✅ Verified deletion of UID=%s from %s", uid, device.name)
+        except Exception as delete_err:
+            logger.warning("⚠️ Error during user deletion check on %s: %s", device.name, delete_err)
+            # Try to delete anyway in case the user exists but get_users failed
             try:
-                users = conn.get_users()
-                user_exists = any(u.uid == uid for u in users)
-                if user_exists:
-                    print(f"⚠️ User with UID={uid} already exists on {device.name}. Deleting first.")
-                    conn.delete_user(uid=uid)
-                    print(f"✅ Successfully deleted existing user UID={uid} from {device.name}")
-                    
-                    # Verify deletion was successful
-                    users_after = conn.get_users()
-                    still_exists = any(u.uid == uid for u in users_after)
-                    if still_exists:
-                        print(f"⚠️ User UID={uid} still exists after deletion attempt on {device.name}")
-                        # Try deletion one more time with force
-                        try:
-                            conn.delete_user(uid=uid)
-                            print(f"🔄 Forced deletion of UID={uid} from {device.name}")
-                        except Exception as force_delete_err:
-                            print(f"❌ Force deletion failed for UID={uid} on {device.name}: {force_delete_err}")
-                            continue  # Skip to next device
-                    else:
-                        print(f"✅ Verified deletion of UID={uid} from {device.name}")
-            except Exception as delete_err:
-                print(f"⚠️ Error during user deletion check on {device.name}: {delete_err}")
-                # Try to delete anyway in case the user exists but get_users failed
-                try:
-                    conn.delete_user(uid=uid)
-                    print(f"✅ Forced deletion attempt for UID={uid} on {device.name}")
-                except Exception as force_err:
-                    if "not found" not in str(force_err).lower():
-                        print(f"❌ Failed to force delete UID={uid} from {device.name}: {force_err}")
-                        continue  # Skip to next device
+                conn.delete_user(uid=uid)
+                logger.info("✅ Forced deletion attempt for UID=%s on %s", uid, device.name)
+            except Exception as force_err:
+                if "not found" not in str(force_err).lower():
+                    logger.error("❌ Failed to force delete UID=%s from %s: %s", uid, device.name, force_err)
+                    return None  # Skip to next device
+
+        # Set user on the device
+        conn.set_user(
+            uid=uid,
+            name=name,
+            privilege=0,
+            password='',
+            group_id='',
+            user_id=str(uid)
+        )
 
-            # Set user on the device
-            conn.set_user(
-                uid=uid,
-                name=name,
-                privilege=0,
-                password='',
-                group_id='',
-                user_id=str(uid)
-            )
+        # Enroll user with improved error messages
+        enrollment_success = False
+        try:
+            logger.info("🔍 Attempting fingerprint enrollment (3 args) for UID %s on %s...", uid, device.name)
+            conn.enroll_user(uid, 0, 0)
+            enrollment_success = True
+            logger.info("✅ Fingerprint enrollment (3 args) successful on %s", device.name)
+        except Exception as enroll_err:
+            error_msg = str(enroll_err).lower()
+            if "timed out" in error_msg or "timeout" in error_msg:
+                logger.warning("⚠️ Fingerprint enrollment timed out on %s. This usually means no finger was placed or device is busy.", device.name)
+            else:
+                logger.warning("⚠️ enroll_user with 3 args failed on %s: %s", device.name, enroll_err)
 
-            # Enroll user with improved error messages
-            enrollment_success = False
             try:
-                print(f"🔍 Attempting fingerprint enrollment (3 args) for UID {uid} on {device.name}...")
-                conn.enroll_user(uid, 0, 0)
+                logger.info("🔍 Attempting fingerprint enrollment (2 args) for UID %s on %s...", uid, device.name)
+                conn.enroll_user(uid, 0)
                 enrollment_success = True
-                print(f"✅ Fingerprint enrollment (3 args) successful on {device.name}")
-            except Exception as enroll_err:
-                error_msg = str(enroll_err).lower()
-                if "timed out" in error_msg or "timeout" in error_msg:
-                    print(f"⚠️ Fingerprint enrollment timed out on {device.name}. This usually means no finger was placed or device is busy.")
+                logger.info("✅ Fingerprint enrollment (2 args) successful on %s", device.name)
+            except Exception as fallback_err:
+                fallback_error_msg = str(fallback_err).lower()
+                if "timed out" in fallback_error_msg or "timeout" in fallback_error_msg:
+                    logger.error("❌ Both enrollment attempts timed out on %s. Please ensure finger is placed on scanner and try again.", device.name)
                 else:
-                    print(f"⚠️ enroll_user with 3 args failed on {device.name}: {enroll_err}")
-                
-                try:
-                    print(f"🔍 Attempting fingerprint enrollment (2 args) for UID {uid} on {device.name}...")
-                    conn.enroll_user(uid, 0)
-                    enrollment_success = True
-                    print(f"✅ Fingerprint enrollment (2 args) successful on {device.name}")
-                except Exception as fallback_err:
-                    fallback_error_msg = str(fallback_err).lower()
-                    if "timed out" in fallback_error_msg or "timeout" in fallback_error_msg:
-                        print(f"❌ Both enrollment attempts timed out on {device.name}. Please ensure finger is placed on scanner and try again.")
-                    else:
-                        print(f"❌ Both enrollment attempts failed on {device.name}: {fallback_err}")
-                    continue
-            
-            if not enrollment_success:
-                continue
+                    logger.error("❌ Both enrollment attempts failed on %s: %s", device.name, fallback_err)
+                return None
+
+        if not enrollment_success:
+            return None
 
-            # Get fingerprint template
-            template = conn.get_user_template(uid, 0)
-            if not template:
-                print(f"❌ No fingerprint template retrieved from {device.name}")
-                continue
+        # Get fingerprint template
+        template = conn.get_user_template(uid, 0)
+        if not template:
+            logger.error("❌ No fingerprint template retrieved from %s", device.name)
+            return None
 
-            # Extract raw fingerprint data
-            if hasattr(template, "template"):
-                raw = template.template
-            elif hasattr(template, "serialize"):
-                raw = template.serialize()
-            elif isinstance(template, str):
-                raw = template.encode()
-            else:
-                print(f"❌ Unsupported fingerprint template format on {device.name}")
-                continue
+        # Extract raw fingerprint data
+        if hasattr(template, "template"):
+            raw = template.template
+        elif hasattr(template, "serialize"):
+            raw = template.serialize()
+        elif isinstance(template, str):
+            raw = template.encode()
+        else:
+            logger.error("❌ Unsupported fingerprint template format on %s", device.name)
+            return None
 
-            # Encode to base64
-            encoded_template = base64.b64encode(raw).decode()
-            print(f"✅ Fingerprint enrolled successfully on device {device.name}")
-            
-            return {
-                "success": True,
-                "template": encoded_template,
-                "device_used": {
-                    "device_id": device.device_id,
-                    "name": device.name,
-                    "location": device.location,
-                    "ip": device.ip
-                },
-                "error": None
-            }
+        # Encode to base64
+        encoded_template = base64.b64encode(raw).decode("ascii")
+        logger.info("✅ Fingerprint enrolled successfully on device %s", device.name)
 
-        except Exception as e:
-            print(f"❌ Enrollment error on device {device.name}: {e}")
-            continue
-        
-        finally:
-            try:
-                conn.enable_device()
-                device_manager.disconnect_device(device)
-            except:
-                pass
-    
+        return {
+            "success": True,
+            "template": encoded_template,
+            "device_used": {
+                "device_id": device.device_id,
+                "name": device.name,
+                "location": device.location,
+                "ip": device.ip
+            },
+            "error": None
+        }
+
+    except Exception as e:
+        logger.error("❌ Enrollment error on device %s: %s", device.name, e)
+        return None
+
+    finally:
+        try:
+            conn.enable_device()
+            device_manager.disconnect_device(device)
+        except:
+            pass
+
+
+def _enrollment_failure(error: str) -> Dict[str, Any]:
     return {
         "success": False,
-        "error": "Failed to enroll on any available device",
+        "error": error,
         "template": None,
         "device_used": None
     }
 
 
+async def enroll_fingerprint_multi_device_async(uid: int, name: str, device_manager: MultiDeviceManager) -> Dict[str, Any]:
+    """
+    Enroll fingerprint on the first available device
+    Returns enrollment result with device info
+    
+    Each device attempt runs in a worker thread so the event loop keeps
+    serving Socket.IO while pyzk blocks
+    """
+    enabled_devices = device_manager.get_enabled_devices()
+    
+    if not enabled_devices:
+        return _enrollment_failure("No enabled devices available")
+    
+    # Try each device until one succeeds
+    for device in enabled_devices:
+        if device_manager.is_backing_off(device):
+            logger.info("⏭️ Skipping device %s (recent connection failure)", device.name)
+            continue
+        result = await asyncio.to_thread(_try_enroll_on, device, uid, name, device_manager)
+        if result:
+            return result
+    
+    return _enrollment_failure("Failed to enroll on any available device")
+
+
 def delete_student_from_all_devices(uid: int, device_manager: MultiDeviceManager) -> Dict[str, Any]:
     """
     Delete a student from all available fingerprint devices
@@ -425,7 +497,7 @@ def delete_student_from_all_devices(uid: int, device_manager: MultiDeviceManager
             continue
             
         try:
-            print(f"🗑️ Attempting to delete UID={uid} from device {device.name}")
+            logger.info("🗑️ Attempting to delete UID=%s from device %s", uid, device.name)
             
             # Check if user exists first
             users = conn.get_users()
@@ -434,18 +506,18 @@ def delete_student_from_all_devices(uid: int, device_manager: MultiDeviceManager
             if user_exists:
                 conn.delete_user(uid=uid)
                 deleted_from_devices.append(device.name)
-                print(f"✅ Successfully deleted UID={uid} from device {device.name}")
+                logger.info("✅ Successfully deleted UID=%s from device %s", uid, device.name)
             else:
-                print(f"ℹ️ UID={uid} not found on device {device.name} (already deleted or never existed)")
+                logger.info("ℹ️ UID=%s not found on device %s (already deleted or never existed)", uid, device.name)
                 deleted_from_devices.append(f"{device.name} (not found)")
             
         except Exception as e:
             error_msg = str(e).lower()
             if "not found" in error_msg or "no such user" in error_msg:
-                print(f"ℹ️ UID={uid} not found on device {device.name} (already deleted)")
+                logger.info("ℹ️ UID=%s not found on device %s (already deleted)", uid, device.name)
                 deleted_from_devices.append(f"{device.name} (not found)")
             else:
-                print(f"❌ Failed to delete UID={uid} from device {device.name}: {e}")
+                logger.error("❌ Failed to delete UID=%s from device %s: %s", uid, device.name, e)
                 failed_devices.append({"device": device.name, "error": str(e)})
         
         finally:
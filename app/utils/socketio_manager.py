@@ -1,6 +1,9 @@
+import logging
 import socketio
 from typing import Dict, Any
 
+logger = logging.getLogger("fingerprint")
+
 # Global Socket.IO server instance
 sio = None
 
@@ -12,7 +15,7 @@ def init_socketio(socketio_server: socketio.AsyncServer):
     # Register event handlers
     register_event_handlers()
     
-    print("✅ Socket.IO manager initialized")
+    logger.info("✅ Socket.IO manager initialized")
 
 async def broadcast_attendance(attendance_data: Dict[str, Any]):
     """Broadcast attendance data to all connected Socket.IO clients
@@ -28,42 +31,58 @@ async def broadcast_attendance(attendance_data: Dict[str, Any]):
             if event_type == 'decision_request':
                 # Special handling for decision requests
                 await sio.emit('decision_request', attendance_data)
-                print(f"📨 Broadcasting decision request to Socket.IO clients: {attendance_data.get('student_name', 'Unknown')} - {attendance_data.get('reason', 'Unknown reason')}")
+                logger.info("📨 Broadcasting decision request to Socket.IO clients: %s - %s", attendance_data.get('student_name', 'Unknown'), attendance_data.get('reason', 'Unknown reason'))
             else:
                 # Regular attendance update
                 await sio.emit('attendance_update', attendance_data)
-                print(f"📡 Broadcasting attendance to Socket.IO clients: {attendance_data.get('student_name', 'Unknown')} - Status: {attendance_data.get('status', 'unknown')}")
+                logger.info("📡 Broadcasting attendance to Socket.IO clients: %s - Status: %s", attendance_data.get('student_name', 'Unknown'), attendance_data.get('status', 'unknown'))
         else:
-            print("⚠️ Socket.IO server not initialized, cannot broadcast")
+            logger.warning("⚠️ Socket.IO server not initialized, cannot broadcast")
     except Exception as e:
-        print(f"⚠️ Error broadcasting via Socket.IO: {e}")
+        logger.warning("⚠️ Error broadcasting via Socket.IO: %s", e)
+
+# Keys shared by every final attendance update sent after an assistant decision
+_ATTENDANCE_UPDATE_BASE = {"type": "attendance_update", "mode": "online", "requires_approval": False}
+
+def _build_attendance_payload(data: Dict[str, Any], status: str, is_correct_group: bool, message: str) -> Dict[str, Any]:
+    """Build the attendance_update payload broadcast after a decision"""
+    uid = data.get('uid', 'Unknown')
+    return {
+        **_ATTENDANCE_UPDATE_BASE,
+        "uid": uid,
+        "student_id": uid,
+        "student_name": data.get('student_name', 'Unknown Student'),
+        "status": status,
+        "is_correct_group": is_correct_group,
+        "message": message,
+    }
 
 def register_event_handlers():
     """Register Socket.IO event handlers"""
     global sio
     
     if not sio:
-        print("⚠️ Cannot register handlers: Socket.IO server not initialized")
+        logger.warning("⚠️ Cannot register handlers: Socket.IO server not initialized")
         return
 
     @sio.event
     async def connect(sid, environ, auth):
         """Handle client connection"""
-        print(f"🔗 Client connected: {sid}")
+        logger.info("🔗 Client connected: %s", sid)
         if auth:
-            print(f"🔐 Auth data received: {auth}")
+            logger.info("🔐 Auth data received: %s", auth)
         await sio.emit('connection_status', {'status': 'connected', 'message': 'Successfully connected to attendance system'}, room=sid)
     
     @sio.event
     async def disconnect(sid):
         """Handle client disconnection"""
-        print(f"🔌 Client disconnected: {sid}")
+        logger.info("🔌 Client disconnected: %s", sid)
     
     @sio.event
     async def decision_response(sid, data):
         """Handle decision responses from frontend"""
         try:
-            print(f"📨 Decision response received from {sid}: {data}")
+            logger.info("📨 Decision response received from %s: %s", sid, data)
             
             decision_id = data.get('decision_id')
             decision = data.get('decision')  # 'approve' or 'reject'
@@ -86,17 +105,10 @@ def register_event_handlers():
                         }, room=sid)
                         
                         # Also broadcast the final attendance update
-                        await broadcast_attendance({
-                            "type": "attendance_update",
-                            "uid": data.get('uid', 'Unknown'),
-                            "student_id": data.get('uid', 'Unknown'),
-                            "student_name": data.get('student_name', 'Unknown Student'),
-                            "status": "approved",
-                            "mode": "online",
-                            "is_correct_group": True,
-                            "message": f"✅ تم الموافقة على حضور {data.get('student_name', 'الطالب')}",
-                            "requires_approval": False
-                        })
+                        await broadcast_attendance(_build_attendance_payload(
+                            data, "approved", True,
+                            f"✅ تم الموافقة على حضور {data.get('student_name', 'الطالب')}"
+                        ))
                     else:
                         # Send rejection confirmation  
                         await sio.emit('decision_response', {
@@ -107,17 +119,10 @@ def register_event_handlers():
                         }, room=sid)
                         
                         # Also broadcast the final attendance update
-                        await broadcast_attendance({
-                            "type": "attendance_update",
-                            "uid": data.get('uid', 'Unknown'),
-                            "student_id": data.get('uid', 'Unknown'), 
-                            "student_name": data.get('student_name', 'Unknown Student'),
-                            "status": "rejected",
-                            "mode": "online",
-                            "is_correct_group": False,
-                            "message": f"❌ تم رفض حضور {data.get('student_name', 'الطالب')}",
-                            "requires_approval": False
-                        })
+                        await broadcast_attendance(_build_attendance_payload(
+                            data, "rejected", False,
+                            f"❌ تم رفض حضور {data.get('student_name', 'الطالب')}"
+                        ))
                 else:
                     # Send error response
                     await sio.emit('decision_response', {
@@ -132,10 +137,10 @@ def register_event_handlers():
                 }, room=sid)
                 
         except Exception as e:
-            print(f"❌ Error processing decision from {sid}: {e}")
+            logger.error("❌ Error processing decision from %s: %s", sid, e)
             await sio.emit('decision_response', {
                 'success': False,
                 'error': str(e)
             }, room=sid)
     
-    print("✅ Socket.IO event handlers registered")
+    logger.info("✅ Socket.IO event handlers registered")
@@ -1,10 +1,299 @@
 import cv2
 import numpy as np
 import json
+import logging
 import os
+from functools import lru_cache
 from typing import Optional, Dict, Any, List
 
-def detect_student_id_template_based(image_path: str) -> Dict[str, Any]:
+logger = logging.getLogger("fingerprint")
+
+# Shape of the printed student ID grid: one column per digit position with
+# a bubble for each digit 0-9. Hough escalation stops early only once the
+# circles found group into a grid of this shape
+ID_ROWS = 10
+ID_COLUMNS = 10
+ID_MIN_COLUMNS = 4
+
+# How far (as a fill ratio) the best cell of an adaptive grid column must
+# lead the runner-up before the column counts as clearly answered
+ADAPTIVE_MIN_MARGIN = 0.05
+
+# Width the bubble sheet template was designed at; much wider scans are
+# shrunk to it (keeping their aspect ratio) since extra pixels gain nothing
+WORKING_WIDTH = 1012
+
+# Fixed binarization level (0-255) for a calibrated scanner with stable
+# exposure, e.g. ID_FIXED_THRESHOLD=128; unset means Otsu per image
+_fixed_threshold = os.getenv("ID_FIXED_THRESHOLD")
+FIXED_THRESHOLD: Optional[int] = int(_fixed_threshold) if _fixed_threshold else None
+
+
+def _binarize(gray: np.ndarray) -> np.ndarray:
+    """
+    Inverted binary image of a sheet (ink and filled bubbles become 255).
+    
+    Uses FIXED_THRESHOLD when configured, which skips Otsu's histogram pass,
+    and Otsu otherwise.
+    """
+    if FIXED_THRESHOLD is not None:
+        _, thresh = cv2.threshold(gray, FIXED_THRESHOLD, 255, cv2.THRESH_BINARY_INV)
+    else:
+        _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    return thresh
+
+
+def _read_gray(image_path: str) -> Optional[np.ndarray]:
+    """
+    Grayscale sheet as imread + cvtColor(BGR2GRAY), or None if unreadable.
+    
+    cv2.IMREAD_GRAYSCALE would skip the BGR buffer, but PNG decoders do
+    their own gray conversion that differs by +-1 on most pixels, and that
+    is enough to change the digits the Hough-based detector reads.
+    """
+    image = cv2.imread(image_path)
+    if image is None:
+        return None
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+@lru_cache(maxsize=8)
+def _generic_roi_candidates(height: int, width: int):
+    """
+    Candidate (left, top, right, bottom) student ID regions for an image size.
+    
+    These are common locations for student ID sections on Arabic bubble
+    sheets, ordered from most to least likely.
+    """
+    return (
+        # Bottom right (most common)
+        (int(width * 0.6), int(height * 0.75), width, height),
+        # Bottom center-right
+        (int(width * 0.45), int(height * 0.8), int(width * 0.9), height),
+        # Center-right area
+        (int(width * 0.5), int(height * 0.6), width, int(height * 0.95)),
+        # Wider bottom area
+        (int(width * 0.3), int(height * 0.85), width, height),
+    )
+
+
+@lru_cache(maxsize=8)
+def _id_roi_bounds(height: int, width: int):
+    """(top, bottom, left, right) of the student ID area for an image size"""
+    return int(height * 0.65), int(height * 0.95), int(width * 0.55), int(width * 0.95)
+
+
+def _to_working_resolution(gray: np.ndarray) -> np.ndarray:
+    """
+    Downscale a grayscale sheet much wider than WORKING_WIDTH to that width.
+    
+    Both axes use the same factor so bubbles stay round for HoughCircles.
+    """
+    height, width = gray.shape
+    if width <= WORKING_WIDTH * 1.2:
+        return gray
+    scale = WORKING_WIDTH / width
+    return cv2.resize(gray, (WORKING_WIDTH, max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+
+@lru_cache(maxsize=16)
+def _disc_offsets(radius: int):
+    """(dy, dx) offsets of every pixel inside a filled circle of the given radius"""
+    yy, xx = np.ogrid[-radius:radius + 1, -radius:radius + 1]
+    dy, dx = np.nonzero(yy * yy + xx * xx <= radius * radius)
+    return dy - radius, dx - radius
+
+
+def _disc_sums(thresh: np.ndarray, xs: np.ndarray, ys: np.ndarray, radius: int):
+    """
+    Integer pixel sum and in-bounds pixel count of a circle around each (x, y).
+    
+    Gathers all discs with one fancy-indexing pass instead of allocating and
+    rasterizing a full-size mask per bubble.
+    """
+    height, width = thresh.shape
+    dy, dx = _disc_offsets(radius)
+    py = ys[:, None] + dy
+    px = xs[:, None] + dx
+    inside = (py >= 0) & (py < height) & (px >= 0) & (px < width)
+    values = thresh[np.clip(py, 0, height - 1), np.clip(px, 0, width - 1)]
+    sums = np.where(inside, values, 0).sum(axis=1)
+    counts = inside.sum(axis=1)
+    return sums, counts
+
+
+def _disc_fill_ratios(thresh: np.ndarray, xs: np.ndarray, ys: np.ndarray, radius: int) -> np.ndarray:
+    """
+    Mean of a binary image inside a circle around each (x, y), scaled to 0-1.
+    
+    Equivalent to cv2.mean(thresh, mask=<filled cv2.circle>) per bubble.
+    """
+    sums, counts = _disc_sums(thresh, xs, ys, radius)
+    return sums / np.maximum(counts, 1) / 255.0
+
+
+def _circle_fill_ratios(thresh: np.ndarray, circles: np.ndarray, shrink: int = 3) -> np.ndarray:
+    """
+    Fill ratio of each (x, y, r) circle, sampled on a disc of radius
+    max(r - shrink, 3) to stay clear of the printed outline.
+    
+    Circles are batched by radius so each distinct radius builds its disc
+    offset table once, instead of rasterizing a full-size mask per circle.
+    """
+    xs, ys = circles[:, 0], circles[:, 1]
+    radii = np.maximum(circles[:, 2] - shrink, 3)
+    fill_ratios = np.empty(len(circles))
+    for radius in np.unique(radii):
+        selected = radii == radius
+        fill_ratios[selected] = _disc_fill_ratios(thresh, xs[selected], ys[selected], int(radius))
+    return fill_ratios
+
+
+def _column_fill_ratios(thresh: np.ndarray, columns: List[np.ndarray]) -> List[np.ndarray]:
+    """Fill ratios of every column's circles, measured together in one batch"""
+    if not columns:
+        return []
+    fill_ratios = _circle_fill_ratios(thresh, np.concatenate(columns))
+    return np.split(fill_ratios, np.cumsum([len(column) for column in columns])[:-1])
+
+
+def _accepted_confidence(column_details: List[Dict[str, Any]]) -> float:
+    """Mean confidence of the columns whose digit was accepted (0.0 if none)"""
+    confidences = np.fromiter((col["confidence"] for col in column_details), dtype=np.float64, count=len(column_details))
+    accepted = np.fromiter((col["detected_digit"] is not None for col in column_details), dtype=bool, count=len(column_details))
+    return float(confidences[accepted].mean()) if accepted.any() else 0.0
+
+
+def _split_columns(circles_sorted: np.ndarray, threshold, min_size: int = 1) -> List[np.ndarray]:
+    """
+    Split x-sorted (x, y, r) circles into columns, starting a new column
+    wherever the x gap to the previous circle exceeds threshold.
+    
+    Columns with fewer than min_size circles are dropped.
+    """
+    if len(circles_sorted) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(circles_sorted[:, 0]) > threshold) + 1
+    return [column for column in np.split(circles_sorted, breaks) if len(column) >= min_size]
+
+
+def _fits_id_grid(circles: np.ndarray) -> bool:
+    """
+    Whether (x, y, r) circles group into an ID grid: ID_MIN_COLUMNS to
+    ID_COLUMNS columns, each holding ID_ROWS - 1 or ID_ROWS bubbles.
+    
+    Columns are split wherever the x gap exceeds the median radius, which
+    is well above the jitter inside a column and below the column pitch.
+    """
+    if len(circles) < ID_MIN_COLUMNS * (ID_ROWS - 1):
+        return False
+    circles_sorted = circles[np.argsort(circles[:, 0], kind="stable")]
+    columns = _split_columns(circles_sorted, max(np.median(circles[:, 2]), 2))
+    return (ID_MIN_COLUMNS <= len(columns) <= ID_COLUMNS
+            and all(ID_ROWS - 1 <= len(column) <= ID_ROWS for column in columns))
+
+
+def _find_bubble_blobs(thresh: np.ndarray, min_size: int = 6, max_size: int = 60) -> np.ndarray:
+    """
+    Roughly circular connected components of a thresholded image as (x, y, r).
+    
+    Both filled bubbles and printed bubble outlines form one component each,
+    so a single labeling pass usually finds the whole ID grid without any
+    Hough accumulator voting. Text and answer marks also pass the shape test,
+    so only components within one pixel of the most common radius are kept,
+    and an empty result is returned when more remain than the ID grid holds.
+    """
+    _, _, stats, centroids = cv2.connectedComponentsWithStats(thresh, connectivity=8)
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    sizes = np.maximum(widths, heights)
+    keep = (sizes >= min_size) & (sizes <= max_size) & (np.abs(widths - heights) < 0.3 * sizes)
+    blobs = np.column_stack([
+        np.round(centroids[1:][keep]),
+        (widths[keep] + heights[keep]) // 4
+    ]).astype("int")
+    if len(blobs) == 0:
+        return blobs
+    
+    modal_radius = np.bincount(blobs[:, 2]).argmax()
+    blobs = blobs[np.abs(blobs[:, 2] - modal_radius) <= 1]
+    if len(blobs) > ID_ROWS * ID_COLUMNS:
+        return blobs[:0]
+    return blobs
+
+
+def _find_id_template() -> Optional[str]:
+    """Path of id_coordinates.json, or None if it cannot be found"""
+    template_path = os.path.join(os.path.dirname(__file__), "..", "..", "BubbleSheetCorrecterModule", "id_coordinates.json")
+    if os.path.exists(template_path):
+        return template_path
+    
+    # Try alternative paths
+    alt_paths = [
+        "/home/ahmed/Desktop/teacher/env/src/BubbleSheetCorrecterModule/id_coordinates.json",
+        "./BubbleSheetCorrecterModule/id_coordinates.json",
+        "../BubbleSheetCorrecterModule/id_coordinates.json"
+    ]
+    for alt_path in alt_paths:
+        if os.path.exists(alt_path):
+            return alt_path
+    return None
+
+
+@lru_cache(maxsize=8)
+def _load_id_template(template_path: str, mtime: float) -> Dict[str, Any]:
+    """
+    Parse id_coordinates.json once per file version (mtime is part of the key).
+    
+    Besides the raw data, returns the bubbles' relative coordinates as arrays
+    and each column as parallel arrays of bubble indices and digits, ordered
+    by digit.
+    """
+    with open(template_path, 'r') as f:
+        template_data = json.load(f)
+    
+    id_bubbles = template_data.get("id_bubbles", [])
+    
+    # Group bubbles by column
+    columns = {}
+    for bubble_idx, bubble in enumerate(id_bubbles):
+        columns.setdefault(bubble["column"], []).append(bubble_idx)
+    for col_idx, bubble_indices in columns.items():
+        bubble_indices.sort(key=lambda i: id_bubbles[i]["number"])
+        indices = np.array(bubble_indices, dtype=np.intp)
+        digits = np.array([id_bubbles[i]["number"] for i in bubble_indices], dtype=np.int8)
+        indices.flags.writeable = False
+        digits.flags.writeable = False
+        columns[col_idx] = (indices, digits)
+    
+    relative_xs = np.array([bubble["relative_x"] for bubble in id_bubbles], dtype=np.float64)
+    relative_ys = np.array([bubble["relative_y"] for bubble in id_bubbles], dtype=np.float64)
+    relative_xs.flags.writeable = False
+    relative_ys.flags.writeable = False
+    
+    return {
+        "id_bubbles": id_bubbles,
+        "relative_xs": relative_xs,
+        "relative_ys": relative_ys,
+        "image_size": template_data.get("image_size", {"width": 1012, "height": 1310}),
+        "columns": columns
+    }
+
+
+@lru_cache(maxsize=8)
+def _scaled_bubble_positions(template_path: str, mtime: float, width: int, height: int):
+    """Pixel (x, y) of every template bubble for an image of the given size"""
+    template = _load_id_template(template_path, mtime)
+    xs = (template["relative_xs"] * width).astype(int)
+    ys = (template["relative_ys"] * height).astype(int)
+    xs.flags.writeable = False
+    ys.flags.writeable = False
+    return xs, ys
+
+
+def detect_student_id_template_based(image_path: Optional[str], gray: Optional[np.ndarray] = None,
+                                     thresh: Optional[np.ndarray] = None,
+                                     generic_gray: Optional[np.ndarray] = None) -> Dict[str, Any]:
     """
     Detect student ID using template-based approach with known bubble coordinates.
     
@@ -12,106 +301,93 @@ def detect_student_id_template_based(image_path: str) -> Dict[str, Any]:
     to detect student ID more accurately.
     
     Args:
-        image_path: Path to the bubble sheet image
+        image_path: Path to the bubble sheet image (may be None when gray is given)
+        gray: Already loaded grayscale image (optional, skips reading image_path)
+        thresh: Otsu threshold of gray (optional, computed if not given)
+        generic_gray: Grayscale for the generic fallback when it must differ
+            from gray, e.g. full resolution when gray was shrunk (optional)
         
     Returns:
         Dict containing detection results
     """
     try:
+        if generic_gray is None:
+            generic_gray = gray
+        
         # Load ID coordinates template
-        template_path = os.path.join(os.path.dirname(__file__), "..", "..", "BubbleSheetCorrecterModule", "id_coordinates.json")
-        
-        if not os.path.exists(template_path):
-            # Try alternative paths
-            alt_paths = [
-                "/home/ahmed/Desktop/teacher/env/src/BubbleSheetCorrecterModule/id_coordinates.json",
-                "./BubbleSheetCorrecterModule/id_coordinates.json",
-                "../BubbleSheetCorrecterModule/id_coordinates.json"
-            ]
-            
-            template_path = None
-            for alt_path in alt_paths:
-                if os.path.exists(alt_path):
-                    template_path = alt_path
-                    break
+        template_path = _find_id_template()
         
-        if not template_path or not os.path.exists(template_path):
+        if not template_path:
             # Fallback to generic detection
-            print("⚠️ Template file not found, using generic detection")
-            return _detect_student_id_generic(image_path)
-        
-        with open(template_path, 'r') as f:
-            template_data = json.load(f)
+            logger.warning("⚠️ Template file not found, using generic detection")
+            return _detect_student_id_generic(image_path, gray=generic_gray)
         
-        id_bubbles = template_data.get("id_bubbles", [])
-        template_size = template_data.get("image_size", {"width": 1012, "height": 1310})
+        # Parsed template is cached until the file changes
+        template_mtime = os.path.getmtime(template_path)
+        template = _load_id_template(template_path, template_mtime)
+        id_bubbles = template["id_bubbles"]
+        template_size = template["image_size"]
+        columns = template["columns"]
         
         if not id_bubbles:
-            print("⚠️ No bubble coordinates found in template, using generic detection")
-            return _detect_student_id_generic(image_path)
-        
-        # Read the image
-        image = cv2.imread(image_path)
-        if image is None:
-            return {
-                "student_id": None,
-                "confidence": 0.0,
-                "message": "Could not read the image file",
-                "debug_info": {"error": "Image loading failed"}
-            }
-        
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            logger.warning("⚠️ No bubble coordinates found in template, using generic detection")
+            return _detect_student_id_generic(image_path, gray=generic_gray)
+        
+        if gray is None:
+            gray = _read_gray(image_path)
+            if gray is None:
+                return {
+                    "student_id": None,
+                    "confidence": 0.0,
+                    "message": "Could not read the image file",
+                    "debug_info": {"error": "Image loading failed"}
+                }
         height, width = gray.shape
         
-        print(f"📏 Image dimensions: {width} x {height}")
-        print(f"📐 Template dimensions: {template_size['width']} x {template_size['height']}")
+        logger.debug("📏 Image dimensions: %s x %s", width, height)
+        logger.debug("📐 Template dimensions: %s x %s", template_size['width'], template_size['height'])
         
         # Calculate scaling factors
         scale_x = width / template_size["width"]
         scale_y = height / template_size["height"]
         
-        print(f"🔍 Scaling factors: X={scale_x:.3f}, Y={scale_y:.3f}")
+        logger.debug("🔍 Scaling factors: X=%.3f, Y=%.3f", scale_x, scale_y)
         
         # Apply threshold to enhance filled circles
-        _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        if thresh is None:
+            thresh = _binarize(gray)
         
-        # Group bubbles by column
-        columns = {}
-        for bubble in id_bubbles:
-            col = bubble["column"]
-            if col not in columns:
-                columns[col] = []
-            columns[col].append(bubble)
+        # Define circle radius (adaptive based on image size)
+        radius = max(8, int(min(width, height) * 0.01))  # 1% of smaller dimension
+        
+        # Convert relative coordinates to actual pixel coordinates (cached per
+        # image size) and measure every bubble at once
+        xs, ys = _scaled_bubble_positions(template_path, template_mtime, width, height)
+        fill_sums, fill_counts = _disc_sums(thresh, xs, ys, radius)
+        fill_ratios = fill_sums / np.maximum(fill_counts, 1) / 255.0
+        
+        # Integer pixel sum a bubble needs to pass the 0.2 fill ratio threshold
+        min_fill_sums = (0.2 * 255 * fill_counts).astype(np.int64)
         
         detected_digits = []
         column_details = []
         
-        print(f"\n🔢 Processing {len(columns)} columns:")
+        logger.debug("🔢 Processing %s columns:", len(columns))
         
         # Process each column
         for col_idx in sorted(columns.keys()):
-            column_bubbles = sorted(columns[col_idx], key=lambda x: x["number"])
+            column_indices, column_digits = columns[col_idx]
+            column_fills = fill_ratios[column_indices]
             
-            print(f"\n  📊 Column {col_idx} ({len(column_bubbles)} bubbles):")
+            logger.debug("  📊 Column %s (%s bubbles):", col_idx, len(column_indices))
             
             digit_scores = []
             
-            for bubble in column_bubbles:
-                # Convert relative coordinates to actual pixel coordinates
-                x = int(bubble["relative_x"] * width)
-                y = int(bubble["relative_y"] * height)
-                
-                # Define circle radius (adaptive based on image size)
-                radius = max(8, int(min(width, height) * 0.01))  # 1% of smaller dimension
-                
-                # Create a mask for the bubble area
-                mask = np.zeros(gray.shape, dtype=np.uint8)
-                cv2.circle(mask, (x, y), radius, 255, -1)
-                
-                # Calculate the mean intensity inside the circle
-                mean_intensity = cv2.mean(thresh, mask=mask)[0]
-                fill_ratio = mean_intensity / 255.0
+            for bubble_idx, fill_ratio in zip(column_indices.tolist(), column_fills.tolist()):
+                bubble = id_bubbles[bubble_idx]
+                x = int(xs[bubble_idx])
+                y = int(ys[bubble_idx])
+                mean_intensity = fill_ratio * 255.0
                 
                 digit_scores.append({
                     "digit": bubble["number"],
@@ -121,16 +397,19 @@ def detect_student_id_template_based(image_path: str) -> Dict[str, Any]:
                     "relative_pos": (bubble["relative_x"], bubble["relative_y"])
                 })
                 
-                print(f"    Digit {bubble['number']}: fill_ratio={fill_ratio:.3f}, intensity={mean_intensity:.1f}, pos=({x},{y})")
+                logger.debug("    Digit %s: fill_ratio=%.3f, intensity=%.1f, pos=(%s,%s)", bubble['number'], fill_ratio, mean_intensity, x, y)
             
             # Find the most filled bubble in this column
             if digit_scores:
-                best_digit = max(digit_scores, key=lambda x: x["fill_ratio"])
+                best_pos = int(column_fills.argmax())
+                best_digit = digit_scores[best_pos]
+                best_idx = column_indices[best_pos]
                 
-                print(f"    🎯 Best digit: {best_digit['digit']} with confidence {best_digit['fill_ratio']:.3f}")
+                logger.debug("    🎯 Best digit: %s with confidence %.3f", best_digit['digit'], best_digit['fill_ratio'])
                 
-                # Only accept if confidence is high enough
-                if best_digit["fill_ratio"] > 0.2:  # Lower threshold for template-based detection
+                # Only accept if confidence is high enough (fill ratio above 0.2,
+                # the lower threshold for template-based detection)
+                if fill_sums[best_idx] > min_fill_sums[best_idx]:
                     detected_digits.append(str(best_digit["digit"]))
                     column_details.append({
                         "column": col_idx,
@@ -138,7 +417,7 @@ def detect_student_id_template_based(image_path: str) -> Dict[str, Any]:
                         "confidence": best_digit["fill_ratio"],
                         "all_scores": digit_scores
                     })
-                    print(f"    ✅ Accepted digit: {best_digit['digit']}")
+                    logger.debug("    ✅ Accepted digit: %s", best_digit['digit'])
                 else:
                     detected_digits.append("?")
                     column_details.append({
@@ -147,9 +426,9 @@ def detect_student_id_template_based(image_path: str) -> Dict[str, Any]:
                         "confidence": best_digit["fill_ratio"],
                         "all_scores": digit_scores
                     })
-                    print(f"    ❓ Unclear digit (low confidence: {best_digit['fill_ratio']:.3f})")
+                    logger.debug("    ❓ Unclear digit (low confidence: %.3f)", best_digit['fill_ratio'])
         
-        print(f"\n🔍 Final detected digits: {detected_digits}")
+        logger.debug("🔍 Final detected digits: %s", detected_digits)
         
         if not detected_digits:
             return {
@@ -164,8 +443,7 @@ def detect_student_id_template_based(image_path: str) -> Dict[str, Any]:
             }
         
         # Calculate overall confidence
-        valid_confidences = [col["confidence"] for col in column_details if col["detected_digit"] is not None]
-        overall_confidence = sum(valid_confidences) / len(valid_confidences) if valid_confidences else 0.0
+        overall_confidence = _accepted_confidence(column_details)
         
         # Create student ID string
         student_id = "".join(detected_digits)
@@ -177,7 +455,7 @@ def detect_student_id_template_based(image_path: str) -> Dict[str, Any]:
         else:
             message = f"Template-based detection successful: {student_id}"
         
-        print(f"🆔 Template-based Student ID: {student_id}")
+        logger.debug("🆔 Template-based Student ID: %s", student_id)
         
         return {
             "student_id": student_id if unclear_count == 0 else None,
@@ -193,7 +471,7 @@ def detect_student_id_template_based(image_path: str) -> Dict[str, Any]:
         }
         
     except Exception as e:
-        print(f"❌ Template-based detection failed: {str(e)}")
+        logger.error("❌ Template-based detection failed: %s", e)
         # Return error instead of recursion to avoid infinite loop
         return {
             "student_id": None,
@@ -203,7 +481,7 @@ def detect_student_id_template_based(image_path: str) -> Dict[str, Any]:
         }
 
 
-def detect_student_id_adaptive(image_path: str) -> Dict[str, Any]:
+def detect_student_id_adaptive(image_path: Optional[str], gray: Optional[np.ndarray] = None) -> Dict[str, Any]:
     """
     Adaptive student ID detection that works with different bubble sheet formats.
     
@@ -211,27 +489,25 @@ def detect_student_id_adaptive(image_path: str) -> Dict[str, Any]:
     in the bottom-right area, using pattern recognition instead of exact coordinates.
     
     Args:
-        image_path: Path to the bubble sheet image
+        image_path: Path to the bubble sheet image (may be None when gray is given)
+        gray: Already loaded grayscale image (optional, skips reading image_path)
         
     Returns:
         Dict containing detection results
     """
     try:
-        # Read the image
-        image = cv2.imread(image_path)
-        if image is None:
-            return {
-                "student_id": None,
-                "confidence": 0.0,
-                "message": "Could not read the image file",
-                "debug_info": {"error": "Image loading failed"}
-            }
-        
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if gray is None:
+            gray = _read_gray(image_path)
+            if gray is None:
+                return {
+                    "student_id": None,
+                    "confidence": 0.0,
+                    "message": "Could not read the image file",
+                    "debug_info": {"error": "Image loading failed"}
+                }
         height, width = gray.shape
         
-        print(f"📏 Image dimensions: {width} x {height}")
+        logger.debug("📏 Image dimensions: %s x %s", width, height)
         
         # Focus on bottom-right area where student ID typically appears
         id_x_start = int(width * 0.65)
@@ -242,80 +518,84 @@ def detect_student_id_adaptive(image_path: str) -> Dict[str, Any]:
         id_roi = gray[id_y_start:id_y_end, id_x_start:id_x_end]
         roi_height, roi_width = id_roi.shape
         
-        print(f"🔍 Student ID ROI: {roi_width} x {roi_height} at ({id_x_start},{id_y_start})")
+        logger.debug("🔍 Student ID ROI: %s x %s at (%s,%s)", roi_width, roi_height, id_x_start, id_y_start)
         
         # Apply threshold to enhance filled circles
-        _, thresh = cv2.threshold(id_roi, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        thresh = _binarize(id_roi)
         
         # Look for digit patterns by analyzing the structure
         # Most Arabic bubble sheets have 4-5 columns for student ID
         detected_digits = []
         confidence_scores = []
         
-        # Try different column counts (4, 5, 6) to find the best fit
-        for num_cols in [4, 5, 6]:
+        # Divide each column into 10 rows (digits 0-9)
+        rows = 10
+        row_height = roi_height // rows
+        
+        best_confidence = 0.0
+        
+        # Try different column counts to find the best fit, starting with the
+        # most common layout (5 columns)
+        for num_cols in [5, 4, 6]:
             col_width = roi_width // num_cols
             temp_digits = []
             temp_confidences = []
             
-            print(f"\n🔢 Trying {num_cols} columns (width: {col_width}px each):")
+            logger.debug("🔢 Trying %s columns (width: %spx each):", num_cols, col_width)
+            
+            # Fill ratio of every (row, column) cell in a single block reduction;
+            # the threshold is 0/255, so summing it directly counts filled pixels
+            cells = thresh[:rows * row_height, :num_cols * col_width]
+            if cells.size:
+                cell_sums = cells.reshape(rows, row_height, num_cols, col_width).sum(axis=(1, 3), dtype=np.int32)
+                fill_matrix = cell_sums / (255.0 * row_height * col_width)
+            else:
+                cell_sums = np.zeros((rows, num_cols), dtype=np.int32)
+                fill_matrix = np.zeros((rows, num_cols))
+            best_rows = cell_sums.argmax(axis=0)
+            best_fills = fill_matrix[best_rows, np.arange(num_cols)]
+            runner_up_sums = np.sort(cell_sums, axis=0)[-2] if rows > 1 else np.zeros(num_cols, dtype=np.int32)
+            
+            # Only accept if fill ratio is significant (above 0.15, a lower
+            # threshold for filled bubbles) and the cell clearly beats the
+            # next best one in its column, compared as integer pixel sums.
+            # A uniformly dark or blank column has no clear answer
+            cell_area = 255 * row_height * col_width
+            min_cell_sum = int(0.15 * cell_area)
+            min_margin = int(ADAPTIVE_MIN_MARGIN * cell_area)
+            best_sums = cell_sums.max(axis=0)
+            accepted = (best_sums > min_cell_sum) & (best_sums - runner_up_sums > min_margin)
             
             for col in range(num_cols):
-                col_x1 = col * col_width
-                col_x2 = min((col + 1) * col_width, roi_width)
-                col_roi = thresh[:, col_x1:col_x2]
-                
-                # Divide column into 10 rows (digits 0-9)
-                rows = 10
-                row_height = roi_height // rows
+                best_row = int(best_rows[col])
+                best_fill = float(best_fills[col])
                 
-                digit_scores = []
-                for row in range(rows):
-                    row_y1 = row * row_height
-                    row_y2 = min((row + 1) * row_height, roi_height)
-                    cell_roi = col_roi[row_y1:row_y2, :]
-                    
-                    # Calculate fill ratio for this cell
-                    white_pixels = np.sum(cell_roi == 255)
-                    total_pixels = cell_roi.size
-                    fill_ratio = white_pixels / total_pixels if total_pixels > 0 else 0
-                    
-                    digit_scores.append({
-                        "digit": row,
-                        "fill_ratio": fill_ratio,
-                        "white_pixels": white_pixels,
-                        "total_pixels": total_pixels
-                    })
-                
-                # Find the most filled cell (highest fill ratio)
-                if digit_scores:
-                    best_digit = max(digit_scores, key=lambda x: x["fill_ratio"])
-                    
-                    # Only accept if fill ratio is significant
-                    if best_digit["fill_ratio"] > 0.15:  # Lower threshold for filled bubbles
-                        temp_digits.append(str(best_digit["digit"]))
-                        temp_confidences.append(best_digit["fill_ratio"])
-                        print(f"  Column {col}: digit {best_digit['digit']} (confidence: {best_digit['fill_ratio']:.3f})")
-                    else:
-                        temp_digits.append("?")
-                        temp_confidences.append(0.0)
-                        print(f"  Column {col}: unclear (best confidence: {best_digit['fill_ratio']:.3f})")
+                if accepted[col]:
+                    temp_digits.append(str(best_row))
+                    temp_confidences.append(best_fill)
+                    logger.debug("  Column %s: digit %s (confidence: %.3f)", col, best_row, best_fill)
                 else:
                     temp_digits.append("?")
                     temp_confidences.append(0.0)
-                    print(f"  Column {col}: no data")
+                    logger.debug("  Column %s: unclear (best confidence: %.3f)", col, best_fill)
             
-            # Calculate overall confidence for this column count
-            valid_confidences = [c for c in temp_confidences if c > 0]
-            overall_confidence = sum(valid_confidences) / len(valid_confidences) if valid_confidences else 0.0
+            # Overall confidence for this column count, counting unclear
+            # columns as 0.0 so partial fits never beat complete ones
+            overall_confidence = float(np.mean(temp_confidences)) if temp_confidences else 0.0
+            complete = bool(accepted.all()) and len(temp_digits) >= 3
             
-            print(f"  Overall confidence: {overall_confidence:.3f}")
-            print(f"  Detected: {''.join(temp_digits)}")
+            logger.debug("  Overall confidence: %.3f", overall_confidence)
+            logger.debug("  Detected: %s", ''.join(temp_digits))
             
             # Use the best result so far
-            if overall_confidence > sum(confidence_scores) / len(confidence_scores) if confidence_scores else 0.0:
+            if overall_confidence > best_confidence:
                 detected_digits = temp_digits
                 confidence_scores = temp_confidences
+                best_confidence = overall_confidence
+            
+            # A confident, complete fit makes the other counts unnecessary
+            if complete and overall_confidence > 0.6:
+                break
         
         if not detected_digits:
             return {
@@ -331,8 +611,9 @@ def detect_student_id_adaptive(image_path: str) -> Dict[str, Any]:
         
         # Calculate final results
         student_id = "".join(detected_digits)
-        valid_confidences = [c for c in confidence_scores if c > 0]
-        overall_confidence = sum(valid_confidences) / len(valid_confidences) if valid_confidences else 0.0
+        confidences = np.asarray(confidence_scores)
+        valid_confidences = confidences[confidences > 0]
+        overall_confidence = float(valid_confidences.mean()) if valid_confidences.size else 0.0
         
         # Check for unclear digits
         unclear_count = student_id.count("?")
@@ -347,7 +628,7 @@ def detect_student_id_adaptive(image_path: str) -> Dict[str, Any]:
             message = f"Adaptive detection failed: student ID too short or invalid"
             final_student_id = None
         
-        print(f"🆔 Adaptive detection result: {student_id}")
+        logger.debug("🆔 Adaptive detection result: %s", student_id)
         
         return {
             "student_id": final_student_id,
@@ -392,33 +673,52 @@ def detect_student_id(image_path: str) -> Dict[str, Any]:
         - debug_info: Additional debugging information
     """
     try:
-        print("\n🔍 Starting student ID detection...")
+        logger.debug("🔍 Starting student ID detection...")
+        
+        # Read the image once; every detector below works from this grayscale.
+        # Only the template grid reuses the full-page threshold: the adaptive
+        # and generic detectors binarize their own ROIs, since Otsu picks a
+        # different level for a small region than for the whole page
+        full_gray = _read_gray(image_path)
+        if full_gray is None:
+            return {
+                "student_id": None,
+                "confidence": 0.0,
+                "message": "Could not read the image file",
+                "debug_info": {"error": "Image loading failed"}
+            }
+        # The template and adaptive detectors work in relative coordinates and
+        # can use a shrunk copy; the generic detector's Hough radii and spacing
+        # are absolute pixels, so it always gets the full-resolution sheet
+        gray = _to_working_resolution(full_gray)
+        thresh = _binarize(gray)
         
         # First try template-based detection
-        print("📋 Attempting template-based detection...")
-        template_result = detect_student_id_template_based(image_path)
+        logger.debug("📋 Attempting template-based detection...")
+        template_result = detect_student_id_template_based(image_path, gray=gray, thresh=thresh,
+                                                           generic_gray=full_gray)
         
         # If template detection succeeds, return it
         if (template_result.get("student_id") is not None and 
             template_result.get("confidence", 0) > 0.2):
-            print(f"✅ Template-based detection successful: {template_result.get('student_id')}")
+            logger.debug("✅ Template-based detection successful: %s", template_result.get('student_id'))
             return template_result
         
-        print("⚠️ Template-based detection failed, trying adaptive detection...")
+        logger.debug("⚠️ Template-based detection failed, trying adaptive detection...")
         
         # Try adaptive detection for different bubble sheet formats
-        adaptive_result = detect_student_id_adaptive(image_path)
+        adaptive_result = detect_student_id_adaptive(image_path, gray=gray)
         
         # If adaptive detection succeeds, return it
         if (adaptive_result.get("student_id") is not None and 
             adaptive_result.get("confidence", 0) > 0.15):
-            print(f"✅ Adaptive detection successful: {adaptive_result.get('student_id')}")
+            logger.debug("✅ Adaptive detection successful: %s", adaptive_result.get('student_id'))
             return adaptive_result
         
-        print("⚠️ Adaptive detection failed, trying generic detection...")
+        logger.debug("⚠️ Adaptive detection failed, trying generic detection...")
         
         # Fall back to generic detection
-        return _detect_student_id_generic(image_path)
+        return _detect_student_id_generic(image_path, gray=full_gray)
         
     except Exception as e:
         return {
@@ -429,54 +729,42 @@ def detect_student_id(image_path: str) -> Dict[str, Any]:
         }
 
 
-def _detect_student_id_generic(image_path: str) -> Dict[str, Any]:
+def _detect_student_id_generic(image_path: str, gray: Optional[np.ndarray] = None) -> Dict[str, Any]:
     """
     Generic student ID detection using HoughCircles.
     
     Args:
         image_path: Path to the bubble sheet image
+        gray: Already loaded grayscale image (optional, skips reading image_path)
         
     Returns:
         Dict containing detection results
     """
     try:
-        # Read the image
-        image = cv2.imread(image_path)
-        if image is None:
-            return {
-                "student_id": None,
-                "confidence": 0.0,
-                "message": "Could not read the image file",
-                "debug_info": {"error": "Image loading failed"}
-            }
-        
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        if gray is None:
+            gray = _read_gray(image_path)
+            if gray is None:
+                return {
+                    "student_id": None,
+                    "confidence": 0.0,
+                    "message": "Could not read the image file",
+                    "debug_info": {"error": "Image loading failed"}
+                }
         
         # Get image dimensions
         height, width = gray.shape
         
-        print(f"📏 Image dimensions: {width} x {height}")
+        logger.debug("📏 Image dimensions: %s x %s", width, height)
         
         # Try multiple specific regions for Arabic bubble sheets
-        # These are common locations for student ID sections
-        roi_candidates = [
-            # Bottom right (most common)
-            (int(width * 0.6), int(height * 0.75), width, height),
-            # Bottom center-right
-            (int(width * 0.45), int(height * 0.8), int(width * 0.9), height),
-            # Center-right area
-            (int(width * 0.5), int(height * 0.6), width, int(height * 0.95)),
-            # Wider bottom area
-            (int(width * 0.3), int(height * 0.85), width, height),
-        ]
+        roi_candidates = _generic_roi_candidates(height, width)
         
         best_result = None
         best_confidence = 0.0
         
         for roi_idx, (roi_left, roi_top, roi_right, roi_bottom) in enumerate(roi_candidates):
-            print(f"\n🔍 Trying ROI {roi_idx + 1}: ({roi_left}, {roi_top}) to ({roi_right}, {roi_bottom})")
-            print(f"📐 ROI size: {roi_right - roi_left} x {roi_bottom - roi_top}")
+            logger.debug("🔍 Trying ROI %s: (%s, %s) to (%s, %s)", roi_idx + 1, roi_left, roi_top, roi_right, roi_bottom)
+            logger.debug("📐 ROI size: %s x %s", roi_right - roi_left, roi_bottom - roi_top)
             
             # Extract ROI
             roi = gray[roi_top:roi_bottom, roi_left:roi_right]
@@ -489,6 +777,14 @@ def _detect_student_id_generic(image_path: str) -> Dict[str, Any]:
                 best_result = result
                 best_result["roi_used"] = roi_idx + 1
                 best_result["roi_coordinates"] = (roi_left, roi_top, roi_right, roi_bottom)
+            
+            # Later regions only replace the best result with a strictly higher
+            # confidence, and fill ratios top out at 1.0, so a complete ID at
+            # full confidence makes the remaining regions (and their Hough
+            # passes) unnecessary
+            if best_result and best_result.get("student_id") is not None and best_confidence >= 1.0:
+                logger.debug("✅ ROI %s is confident enough, skipping remaining regions", roi_idx + 1)
+                break
         
         return best_result or {
             "student_id": None,
@@ -523,7 +819,12 @@ def _detect_in_roi(roi, roi_left, roi_top, roi_right=None, roi_bottom=None):
     try:
         
         # Apply threshold to make circles more visible
-        _, thresh = cv2.threshold(roi, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        thresh = _binarize(roi)
+        
+        # A single connected-components pass finds the bubble grid on clean
+        # scans; only fall back to HoughCircles when it comes up short
+        blob_circles = _find_bubble_blobs(thresh)
+        logger.debug("🔍 Blob detection: Found %s circles", len(blob_circles))
         
         # Try multiple circle detection approaches for better results
         circles = None
@@ -544,8 +845,18 @@ def _detect_in_roi(roi, roi_left, roi_top, roi_right=None, roi_bottom=None):
         best_circles = None
         best_count = 0
         
-        # Try all detection methods and use the one that finds most circles
+        grid_found = _fits_id_grid(blob_circles)
+        if grid_found:
+            best_circles = blob_circles[None, :, :]
+            best_count = len(blob_circles)
+        
+        # Escalate through the detection methods (strictest first) until one
+        # finds circles that form a whole ID grid; otherwise try them all and
+        # keep the result with the most circles
         for attempt, params in enumerate(detection_attempts):
+            if grid_found:
+                break
+            
             test_circles = cv2.HoughCircles(
                 thresh,
                 cv2.HOUGH_GRADIENT,
@@ -555,17 +866,22 @@ def _detect_in_roi(roi, roi_left, roi_top, roi_right=None, roi_bottom=None):
             if test_circles is not None:
                 circle_count = len(test_circles[0])
                 circles_detected.append((attempt + 1, circle_count))
-                print(f"🔍 Attempt {attempt + 1}: Found {circle_count} circles")
+                logger.debug("🔍 Attempt %s: Found %s circles", attempt + 1, circle_count)
                 
                 # Keep the result with most circles found
                 if circle_count > best_count:
                     best_circles = test_circles
                     best_count = circle_count
+                
+                if _fits_id_grid(np.round(test_circles[0]).astype("int")):
+                    best_circles = test_circles
+                    best_count = circle_count
+                    grid_found = True
             else:
-                print(f"🔍 Attempt {attempt + 1}: No circles found")
+                logger.debug("🔍 Attempt %s: No circles found", attempt + 1)
         
         circles = best_circles
-        print(f"🎯 Using detection result with {best_count} circles")
+        logger.debug("🎯 Using detection result with %s circles", best_count)
         
         if circles is None:
             return {
@@ -581,104 +897,83 @@ def _detect_in_roi(roi, roi_left, roi_top, roi_right=None, roi_bottom=None):
             }
         
         circles = np.round(circles[0, :]).astype("int")
-        print(f"🔍 Found {len(circles)} circles in student ID area")
+        logger.debug("🔍 Found %s circles in student ID area", len(circles))
         
         # Sort circles by x-coordinate to identify columns
-        circles_sorted = sorted(circles, key=lambda c: c[0])
+        circles_sorted = circles[np.argsort(circles[:, 0], kind="stable")]
         
         # For Arabic bubble sheets, we expect exactly 5 columns of 10 circles each (digits 0-9)
         # Group circles into columns based on x-coordinate proximity
         digit_columns = []
         
-        # Debug: print all circle positions
-        print(f"📍 All circle positions (x, y, r):")
-        for i, (x, y, r) in enumerate(circles_sorted):
-            print(f"  Circle {i}: ({x}, {y}, {r})")
+        # Debug: log all circle positions
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📍 All circle positions (x, y, r):")
+            for i, (x, y, r) in enumerate(circles_sorted):
+                logger.debug("  Circle %s: (%s, %s, %s)", i, x, y, r)
+        
+        # Gaps between consecutive circles, shared by the adaptive and fallback grouping
+        x_gaps = np.diff(circles_sorted[:, 0])
         
         # For Arabic student ID, detect columns dynamically (could be 4, 5, or more columns)
         # Use more intelligent column detection
         if len(circles_sorted) >= 4:  # Need at least 4 circles (minimum for student ID)
-            # Calculate gaps between consecutive circles
-            x_positions = [c[0] for c in circles_sorted]
-            x_gaps = []
-            
-            for i in range(1, len(x_positions)):
-                gap = x_positions[i] - x_positions[i-1]
-                x_gaps.append((gap, i))  # Store gap and position
-            
             # Find the largest gaps which likely represent column separations
-            x_gaps_sorted = sorted(x_gaps, key=lambda x: x[0], reverse=True)
-            print(f"📊 Top gaps between circles: {x_gaps_sorted[:10]}")
+            if logger.isEnabledFor(logging.DEBUG):
+                top_gap_positions = np.argsort(-x_gaps, kind="stable")[:10]
+                logger.debug("📊 Top gaps between circles: %s", [(x_gaps[i], int(i) + 1) for i in top_gap_positions])
             
             # Use adaptive threshold based on gap distribution
-            if x_gaps:
-                # Try different percentiles to find column boundaries
-                gaps_only = [gap[0] for gap in x_gaps]
-                percentile_75 = sorted(gaps_only)[int(len(gaps_only) * 0.75)] if gaps_only else 30
-                column_threshold = max(20, percentile_75)
-            else:
-                column_threshold = 30
+            # (75th percentile of the gaps, picked by index as before)
+            percentile_index = int(len(x_gaps) * 0.75)
+            percentile_75 = np.partition(x_gaps, percentile_index)[percentile_index]
+            column_threshold = max(20, percentile_75)
             
-            print(f"🔍 Using adaptive column threshold: {column_threshold}px")
+            logger.debug("🔍 Using adaptive column threshold: %spx", column_threshold)
             
-            # Group circles into columns with more flexible logic
-            current_column = []
+            # Group circles into columns (accept even single circles)
+            digit_columns = _split_columns(circles_sorted, column_threshold)
             
-            for i, (x, y, r) in enumerate(circles_sorted):
-                if not current_column:
-                    current_column = [(x, y, r)]
-                else:
-                    last_x = current_column[-1][0]
-                    gap_to_last = abs(x - last_x)
-                    
-                    if gap_to_last <= column_threshold:
-                        current_column.append((x, y, r))
-                    else:
-                        # End current column and start new one
-                        if len(current_column) >= 1:  # Accept even single circles
-                            digit_columns.append(current_column)
-                        current_column = [(x, y, r)]
-            
-            # Don't forget the last column
-            if len(current_column) >= 1:
-                digit_columns.append(current_column)
-            
-            print(f"📊 Found {len(digit_columns)} columns with adaptive threshold")
-            for col_idx, col in enumerate(digit_columns):
-                col_x_positions = [c[0] for c in col]
-                col_y_positions = [c[1] for c in col]
-                print(f"  Column {col_idx}: {len(col)} circles, X range: {min(col_x_positions)}-{max(col_x_positions)}, Y range: {min(col_y_positions)}-{max(col_y_positions)}")
-                for circle_idx, (x, y, r) in enumerate(col):
-                    print(f"    Circle {circle_idx}: ({x}, {y}, {r})")
+            logger.debug("📊 Found %s columns with adaptive threshold", len(digit_columns))
+            if logger.isEnabledFor(logging.DEBUG):
+                for col_idx, col in enumerate(digit_columns):
+                    logger.debug("  Column %s: %s circles, X range: %s-%s, Y range: %s-%s", col_idx, len(col), col[:, 0].min(), col[:, 0].max(), col[:, 1].min(), col[:, 1].max())
+                    for circle_idx, (x, y, r) in enumerate(col):
+                        logger.debug("    Circle %s: (%s, %s, %s)", circle_idx, x, y, r)
         
         # Fallback: try with fixed thresholds if dynamic approach fails
         if len(digit_columns) < 3:
-            print(f"🔄 Dynamic grouping found {len(digit_columns)} columns, trying fixed thresholds...")
+            logger.debug("🔄 Dynamic grouping found %s columns, trying fixed thresholds...", len(digit_columns))
             
-            for threshold in [30, 50, 80, 120]:
-                digit_columns = []
-                current_column = []
-                
-                for x, y, r in circles_sorted:
-                    if not current_column:
-                        current_column = [(x, y, r)]
-                    else:
-                        last_x = current_column[-1][0]
-                        if abs(x - last_x) <= threshold:
-                            current_column.append((x, y, r))
-                        else:
-                            if len(current_column) >= 2:  # Minimum circles per column
-                                digit_columns.append(current_column)
-                            current_column = [(x, y, r)]
-                
-                if len(current_column) >= 2:
-                    digit_columns.append(current_column)
-                
-                print(f"🔍 Threshold {threshold}px found {len(digit_columns)} columns")
-                
-                # If we found a reasonable number of columns, use this
-                if len(digit_columns) >= 3:
+            # Column label of every circle under each threshold at once (one row
+            # per threshold), then count columns with at least 2 circles
+            thresholds = np.array([30, 50, 80, 120])
+            column_labels = np.zeros((len(thresholds), len(circles_sorted)), dtype=np.int32)
+            np.cumsum(x_gaps[None, :] > thresholds[:, None], axis=1, out=column_labels[:, 1:])
+            column_counts = [int((np.bincount(labels) >= 2).sum()) for labels in column_labels]
+            
+            # Use the first threshold that finds a reasonable number of columns
+            chosen = len(thresholds) - 1
+            for i, (threshold, column_count) in enumerate(zip(thresholds, column_counts)):
+                logger.debug("🔍 Threshold %spx found %s columns", threshold, column_count)
+                if column_count >= 3:
+                    chosen = i
                     break
+            
+            # Minimum 2 circles per column
+            digit_columns = _split_columns(circles_sorted, thresholds[chosen], min_size=2)
+        
+        if len(digit_columns) > ID_COLUMNS:
+            return {
+                "student_id": None,
+                "confidence": 0.0,
+                "message": f"Found {len(digit_columns)} digit columns, more than the {ID_COLUMNS}-digit ID field",
+                "debug_info": {
+                    "circles_found": int(len(circles)),
+                    "columns_found": len(digit_columns),
+                    "roi_coordinates": (roi_left, roi_top, roi_right, roi_bottom)
+                }
+            }
         
         if len(digit_columns) == 0:
             return {
@@ -698,27 +993,23 @@ def _detect_in_roi(roi, roi_left, roi_top, roi_right=None, roi_bottom=None):
         detected_digits = []
         column_details = []
         
-        print(f"\n🔢 Processing {len(digit_columns)} columns for digit detection:")
+        logger.debug("🔢 Processing %s columns for digit detection:", len(digit_columns))
         
-        for col_idx, column in enumerate(digit_columns):
-            print(f"\n  📊 Column {col_idx} analysis:")
-            
-            # Sort circles in column by y-coordinate (top to bottom)
-            column = sorted(column, key=lambda c: c[1])
+        # Sort circles in each column by y-coordinate (top to bottom)
+        digit_columns = [column[np.argsort(column[:, 1], kind="stable")] for column in digit_columns]
+        
+        # Fill ratio (higher values indicate more filled) of every circle in
+        # every column, measured in one batch and then split back per column
+        column_fill_ratios = _column_fill_ratios(thresh, digit_columns)
+        
+        for col_idx, (column, fill_ratios) in enumerate(zip(digit_columns, column_fill_ratios)):
+            logger.debug("  📊 Column %s analysis:", col_idx)
             
             # Analyze each circle to find the filled one
             digit_scores = []
             for digit_idx, (x, y, r) in enumerate(column):
-                # Create a mask for the circle
-                mask = np.zeros(roi.shape, dtype=np.uint8)
-                # Adjust coordinates relative to ROI
-                cv2.circle(mask, (x, y), max(r - 3, 3), 255, -1)
-                
-                # Calculate the mean intensity inside the circle
-                mean_intensity = cv2.mean(thresh, mask=mask)[0]
-                
-                # Calculate fill ratio (higher values indicate more filled)
-                fill_ratio = mean_intensity / 255.0
+                fill_ratio = fill_ratios[digit_idx]
+                mean_intensity = fill_ratio * 255.0
                 
                 digit_scores.append({
                     "digit": int(digit_idx if digit_idx <= 9 else digit_idx % 10),
@@ -727,13 +1018,13 @@ def _detect_in_roi(roi, roi_left, roi_top, roi_right=None, roi_bottom=None):
                     "position": (int(x), int(y), int(r))
                 })
                 
-                print(f"    Position {digit_idx} (digit {digit_idx if digit_idx <= 9 else digit_idx % 10}): fill_ratio={fill_ratio:.3f}, intensity={mean_intensity:.1f}, pos=({x},{y})")
+                logger.debug("    Position %s (digit %s): fill_ratio=%.3f, intensity=%.1f, pos=(%s,%s)", digit_idx, digit_idx if digit_idx <= 9 else digit_idx % 10, fill_ratio, mean_intensity, x, y)
             
             # Find the most filled circle (highest fill ratio)
             if digit_scores:
                 best_digit = max(digit_scores, key=lambda x: x["fill_ratio"])
                 
-                print(f"    🎯 Best digit: {best_digit['digit']} with confidence {best_digit['fill_ratio']:.3f}")
+                logger.debug("    🎯 Best digit: %s with confidence %.3f", best_digit['digit'], best_digit['fill_ratio'])
                 
                 # Only consider it a valid digit if confidence is high enough
                 if best_digit["fill_ratio"] > 0.3:
@@ -744,7 +1035,7 @@ def _detect_in_roi(roi, roi_left, roi_top, roi_right=None, roi_bottom=None):
                         "confidence": best_digit["fill_ratio"],
                         "all_scores": digit_scores
                     })
-                    print(f"    ✅ Accepted digit: {best_digit['digit']}")
+                    logger.debug("    ✅ Accepted digit: %s", best_digit['digit'])
                 else:
                     detected_digits.append("?")  # Unclear digit
                     column_details.append({
@@ -753,12 +1044,12 @@ def _detect_in_roi(roi, roi_left, roi_top, roi_right=None, roi_bottom=None):
                         "confidence": best_digit["fill_ratio"],
                         "all_scores": digit_scores
                     })
-                    print(f"    ❓ Unclear digit (low confidence: {best_digit['fill_ratio']:.3f})")
+                    logger.debug("    ❓ Unclear digit (low confidence: %.3f)", best_digit['fill_ratio'])
             else:
-                print(f"    ❌ No digit scores generated")
+                logger.debug("    ❌ No digit scores generated")
         
-        print(f"\n🔍 Final detected digits: {detected_digits}")
-        print(f"🆔 Student ID: {''.join(detected_digits)}")
+        logger.debug("🔍 Final detected digits: %s", detected_digits)
+        logger.debug("🆔 Student ID: %s", ''.join(detected_digits))
         
         # Construct student ID from detected digits
         if not detected_digits:
@@ -773,8 +1064,7 @@ def _detect_in_roi(roi, roi_left, roi_top, roi_right=None, roi_bottom=None):
             }
         
         # Calculate overall confidence based on individual digit confidences
-        valid_confidences = [col["confidence"] for col in column_details if col["detected_digit"] is not None]
-        overall_confidence = sum(valid_confidences) / len(valid_confidences) if valid_confidences else 0.0
+        overall_confidence = _accepted_confidence(column_details)
         
         # Create student ID string
         student_id = "".join(detected_digits)
@@ -833,20 +1123,24 @@ def detect_student_id_from_image_array(image: np.ndarray) -> Dict[str, Any]:
         else:
             gray = image
         
+        # Score the known bubble grid first: its centers come straight from
+        # id_coordinates.json, so no Hough accumulator or column grouping is needed
+        if _find_id_template():
+            grid_result = detect_student_id_template_based(None, gray=gray)
+            if grid_result.get("student_id") is not None and grid_result.get("confidence", 0) > 0.2:
+                return grid_result
+        
         # Get image dimensions
         height, width = gray.shape
         
         # Define ROI for student ID area
-        roi_top = int(height * 0.65)
-        roi_bottom = int(height * 0.95)
-        roi_left = int(width * 0.55)
-        roi_right = int(width * 0.95)
+        roi_top, roi_bottom, roi_left, roi_right = _id_roi_bounds(height, width)
         
         # Extract ROI
         roi = gray[roi_top:roi_bottom, roi_left:roi_right]
         
         # Apply threshold
-        _, thresh = cv2.threshold(roi, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        thresh = _binarize(roi)
         
         # Find circles with optimized parameters for student ID
         circles = cv2.HoughCircles(
@@ -869,27 +1163,11 @@ def detect_student_id_from_image_array(image: np.ndarray) -> Dict[str, Any]:
             }
         
         circles = np.round(circles[0, :]).astype("int")
-        circles = sorted(circles, key=lambda c: c[0])
+        circles = circles[np.argsort(circles[:, 0], kind="stable")]
         
-        # Group circles by columns and process digits
-        digit_columns = []
-        current_column = []
+        # Group circles by columns (at least 3 circles each) and process digits
         column_threshold = 30
-        
-        for x, y, r in circles:
-            if not current_column:
-                current_column = [(x, y, r)]
-            else:
-                last_x = current_column[-1][0]
-                if abs(x - last_x) <= column_threshold:
-                    current_column.append((x, y, r))
-                else:
-                    if len(current_column) >= 3:
-                        digit_columns.append(current_column)
-                    current_column = [(x, y, r)]
-        
-        if len(current_column) >= 3:
-            digit_columns.append(current_column)
+        digit_columns = _split_columns(circles, column_threshold, min_size=3)
         
         if not digit_columns:
             return {
@@ -903,20 +1181,14 @@ def detect_student_id_from_image_array(image: np.ndarray) -> Dict[str, Any]:
         detected_digits = []
         confidences = []
         
-        for column in digit_columns:
-            column = sorted(column, key=lambda c: c[1])
-            
+        digit_columns = [column[np.argsort(column[:, 1], kind="stable")] for column in digit_columns]
+        
+        for fill_ratios in _column_fill_ratios(thresh, digit_columns):
             digit_scores = []
-            for digit_idx, (x, y, r) in enumerate(column):
-                mask = np.zeros(roi.shape, dtype=np.uint8)
-                cv2.circle(mask, (x, y), max(r - 3, 3), 255, -1)
-                
-                mean_intensity = cv2.mean(thresh, mask=mask)[0]
-                fill_ratio = mean_intensity / 255.0
-                
+            for digit_idx, fill_ratio in enumerate(fill_ratios):
                 digit_scores.append({
                     "digit": digit_idx if digit_idx <= 9 else digit_idx % 10,
-                    "fill_ratio": fill_ratio
+                    "fill_ratio": float(fill_ratio)
                 })
             
             if digit_scores:
@@ -936,7 +1208,7 @@ def detect_student_id_from_image_array(image: np.ndarray) -> Dict[str, Any]:
                 "debug_info": {"columns_found": len(digit_columns)}
             }
         
-        overall_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        overall_confidence = float(np.mean(confidences)) if confidences else 0.0
         student_id = "".join(detected_digits)
         unclear_count = student_id.count("?")
         
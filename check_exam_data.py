@@ -13,14 +13,39 @@ Author: Ahmed
 Date: 2025-08-10
 """
 
+import os
 import sys
 import requests
 import json
+from functools import lru_cache
 from pprint import pprint
 
 MAIN_BACKEND_URL = "http://localhost:8000"
 FINGERPRINT_URL = "http://localhost:8001"
 
+# (connect, read) timeouts: fail fast when a service is down
+REQUEST_TIMEOUT = (1, 30)
+
+# Shared session so both checks reuse keep-alive connections: one pool per
+# service host, each holding the single connection the sequential checks use
+_SESSION = requests.Session()
+_ADAPTER = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=1)
+_SESSION.mount("http://", _ADAPTER)
+_SESSION.mount("https://", _ADAPTER)
+
+@lru_cache(maxsize=None)
+def _dir_entries(directory):
+    """Names in a directory, listed once per run (empty if it does not exist)."""
+    try:
+        return frozenset(os.listdir(directory or "."))
+    except OSError:
+        return frozenset()
+
+def _path_exists(path):
+    """Check a path against its cached parent listing instead of stat-ing it."""
+    directory, name = os.path.split(path)
+    return name in _dir_entries(directory)
+
 def check_exam_data(exam_id):
     """Check exam data from main backend."""
     
@@ -29,7 +54,7 @@ def check_exam_data(exam_id):
     
     try:
         # Get exam data from main backend
-        response = requests.get(f"{MAIN_BACKEND_URL}/internal/exams/{exam_id}", timeout=30)
+        response = _SESSION.get(f"{MAIN_BACKEND_URL}/internal/exams/{exam_id}", timeout=REQUEST_TIMEOUT)
         
         if response.status_code != 200:
             print(f"❌ Failed to get exam data: {response.status_code}")
@@ -52,7 +77,6 @@ def check_exam_data(exam_id):
             print("✅ Solution photo path exists")
             
             # Check if file actually exists
-            import os
             possible_paths = [
                 solution_photo,
                 os.path.join("/home/ahmed/Desktop/teacher/venv/src", solution_photo),
@@ -61,8 +85,8 @@ def check_exam_data(exam_id):
             
             file_found = False
             for path in possible_paths:
-                if os.path.exists(path):
-                    file_size = os.path.getsize(path)
+                if _path_exists(path):
+                    file_size = os.stat(path).st_size
                     print(f"✅ File found at: {path} ({file_size:,} bytes)")
                     file_found = True
                     break
@@ -115,7 +139,7 @@ def check_debug_endpoint(exam_id):
     print("-" * 30)
     
     try:
-        response = requests.get(f"{FINGERPRINT_URL}/exams/{exam_id}/debug", timeout=30)
+        response = _SESSION.get(f"{FINGERPRINT_URL}/exams/{exam_id}/debug", timeout=REQUEST_TIMEOUT)
         
         if response.status_code == 200:
             debug_data = response.json()
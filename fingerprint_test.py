@@ -13,25 +13,33 @@ DEVICE_IP = "192.168.1.201"  # Assuming 201 means .201 in local network
 DEVICE_PORT = 4370  # Default port for ZKTeco devices
 TIMEOUT = 5  # Connection timeout in seconds
 
+# ZKTeco connect command (simplified)
+ZK_CONNECT_CMD = b'\x50\x50\x82\x7d\x13\x00\x00\x00\x14\x05\x00\x00\x00\x00\x00\x00'
+
 def test_tcp_connection(ip, port):
-    """Test basic TCP connection to the device"""
+    """
+    Test basic TCP connection to the device.
+    
+    Returns (success, sock); on success sock is the still-open connection so
+    the protocol test can reuse it, otherwise it is None.
+    """
     print(f"Testing TCP connection to {ip}:{port}...")
     
     try:
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.settimeout(TIMEOUT)
         result = sock.connect_ex((ip, port))
-        sock.close()
         
         if result == 0:
             print(f"✓ TCP connection successful to {ip}:{port}")
-            return True
+            return True, sock
         else:
+            sock.close()
             print(f"✗ TCP connection failed to {ip}:{port}")
-            return False
+            return False, None
     except Exception as e:
         print(f"✗ Connection error: {e}")
-        return False
+        return False, None
 
 def ping_device(ip):
     """Test ping connectivity to the device"""
@@ -52,23 +60,24 @@ def ping_device(ip):
         print(f"✗ Ping error: {e}")
         return False
 
-def test_zkteco_connection(ip, port=4370):
-    """Test ZKTeco device specific connection"""
+def test_zkteco_connection(ip, port=4370, sock=None):
+    """Test ZKTeco device specific connection, reusing sock if already connected"""
     print(f"Testing ZKTeco device connection to {ip}:{port}...")
     
     try:
-        # Simple ZKTeco protocol test - send connect command
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(TIMEOUT)
-        sock.connect((ip, port))
-        
-        # ZKTeco connect command (simplified)
-        connect_cmd = b'\x50\x50\x82\x7d\x13\x00\x00\x00\x14\x05\x00\x00\x00\x00\x00\x00'
-        sock.send(connect_cmd)
+        connected = sock is not None
+        if not connected:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(TIMEOUT)
         
-        # Wait for response
-        response = sock.recv(1024)
-        sock.close()
+        # Simple ZKTeco protocol test - send connect command
+        with sock:
+            if not connected:
+                sock.connect((ip, port))
+            sock.sendall(ZK_CONNECT_CMD)
+            
+            # Wait for response
+            response = sock.recv(1024)
         
         if response:
             print(f"✓ ZKTeco device responded: {len(response)} bytes received")
@@ -96,13 +105,13 @@ def main():
     print()
     
     # Test 2: TCP connection
-    tcp_success = test_tcp_connection(DEVICE_IP, DEVICE_PORT)
+    tcp_success, sock = test_tcp_connection(DEVICE_IP, DEVICE_PORT)
     print()
     
-    # Test 3: ZKTeco specific connection (if TCP works)
+    # Test 3: ZKTeco specific connection (if TCP works), over the same connection
     zk_success = False
     if tcp_success:
-        zk_success = test_zkteco_connection(DEVICE_IP, DEVICE_PORT)
+        zk_success = test_zkteco_connection(DEVICE_IP, DEVICE_PORT, sock=sock)
         print()
     
     # Summary
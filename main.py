@@ -1,3 +1,8 @@
+from app.utils.logging_setup import setup_logging, shutdown_logging
+
+# Configure logging before importing modules that log at import time
+setup_logging()
+
 from fastapi import FastAPI
 from app.models.counter import Counter
 from app.models.fingerprint_session import FingerprintSession
@@ -15,6 +20,10 @@ import uvicorn
 
 # Background task
 import asyncio
+import os
+
+# Per-packet Socket.IO/Engine.IO logging, only when SIO_DEBUG=1
+SIO_DEBUG = os.getenv("SIO_DEBUG") == "1"
 
 app = FastAPI()
 
@@ -27,8 +36,8 @@ sio = socketio.AsyncServer(
         "https://xthw34nm-8001.uks1.devtunnels.ms",
         "*"  # Allow all origins for development
     ],
-    logger=True,
-    engineio_logger=True
+    logger=SIO_DEBUG,
+    engineio_logger=SIO_DEBUG
 )
 
 # Wrap FastAPI app with Socket.IO
@@ -58,20 +67,16 @@ async def startup_event():
     asyncio.create_task(sync_missing_students_worker())
     print("✅ Background sync task started!")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    shutdown_logging()
+
 # Include your routes
 app.include_router(fingerprint.router)
 app.include_router(fingerprint_attendance.router)
 app.include_router(exam_correction.router)
 app.include_router(bubble.router)
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:3000"],  
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "https://xthw34nm-8001.uks1.devtunnels.ms"],
@@ -20,14 +20,100 @@ Date: 2025-08-10
 
 import os
 import sys
-import argparse
-from datetime import datetime
+import time
+import logging
+import subprocess
+from urllib.parse import urlparse
+from functools import lru_cache, wraps
 import base64
 
+class _BatchedStdoutHandler(logging.Handler):
+    """Collect formatted records and write them to stdout in one call per flush()."""
+    
+    def __init__(self):
+        super().__init__()
+        self._pending = []
+    
+    def emit(self, record):
+        try:
+            self._pending.append(self.format(record) + '\n')
+        except Exception:
+            self.handleError(record)
+    
+    def flush(self):
+        self.acquire()
+        try:
+            if self._pending:
+                sys.stdout.write(''.join(self._pending))
+                sys.stdout.flush()
+                self._pending.clear()
+        finally:
+            self.release()
+
+# Status output: one stdout write per operation instead of one per line;
+# logging.shutdown() flushes whatever is left at exit
+log = logging.getLogger("bubble")
+_log_handler = _BatchedStdoutHandler()
+log.addHandler(_log_handler)
+log.setLevel(logging.INFO)
+log.propagate = False
+
+def _flush_log_after(func):
+    """Flush the batched status output when func returns or raises."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _log_handler.flush()
+    return wrapper
+
+# Buffer size for the user-space fallback copy loop
+_COPY_BUFSIZE = 1 << 20
+
+# Raw byte I/O for os.open on Windows (no newline translation); 0 elsewhere
+_O_BINARY = getattr(os, 'O_BINARY', 0)
+
+# Extensions a downloaded file may keep as-is
+_IMAGE_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'bmp'})
+
+# [epoch second, formatted timestamp] of the last save
+_LAST_TS = [None, ""]
+
+def _timestamp():
+    """Local "%Y%m%d_%H%M%S" for now, formatted at most once per second."""
+    now = int(time.time())
+    if now != _LAST_TS[0]:
+        _LAST_TS[:] = [now, time.strftime("%Y%m%d_%H%M%S", time.localtime(now))]
+    return _LAST_TS[1]
+
+@lru_cache(maxsize=16)
+def _first_present(names, directory, epoch):
+    """First of names found in one scandir pass, cached for as long as epoch stays the same."""
+    # Compare under normcase so case-insensitive filesystems (Windows) match
+    # the way os.path.exists() would
+    wanted = {os.path.normcase(name): name for name in names}
+    first = os.path.normcase(names[0])
+    present = set()
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            key = os.path.normcase(entry.name)
+            if key in wanted:
+                present.add(wanted[key])
+                if key == first:
+                    break
+    return next((name for name in names if name in present), None)
+
+def _find_first_cached(names, directory='.'):
+    """Directory probe for any of names that re-reads the directory at most once every 5 seconds."""
+    # Key on the absolute path so a chdir() between calls can't serve another directory's result
+    return _first_present(tuple(names), os.path.abspath(directory), int(time.monotonic()) // 5)
+
+@_flush_log_after
 def create_bubble_sheet_image():
     """Create and save the bubble sheet template image."""
     
-    print("📄 Creating bubble sheet template...")
+    log.info("📄 Creating bubble sheet template...")
     
     # The bubble sheet image you provided (converted to base64 would go here)
     # Since I can't directly convert the image you showed, I'll create a script
@@ -59,7 +145,7 @@ def create_bubble_sheet_image():
     with open(template_info_file, 'w', encoding='utf-8') as f:
         f.write(bubble_sheet_data)
     
-    print(f"📝 Created info file: {template_info_file}")
+    log.info("📝 Created info file: %s", template_info_file)
     
     # Check if user has provided the image file
     template_files = [
@@ -69,20 +155,168 @@ def create_bubble_sheet_image():
         "bubble_sheet.jpg"
     ]
     
-    found_template = None
-    for template_file in template_files:
-        if os.path.exists(template_file):
-            found_template = template_file
-            break
+    return _find_first_cached(template_files)
+
+def _fadvise(fd, advice_name):
+    """posix_fadvise over the whole file, where the platform supports it."""
+    advice = getattr(os, advice_name, None)
+    if advice is not None and hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fd, 0, 0, advice)
+        except OSError:
+            pass
+
+def _copy_stat(st, dst):
+    """Give dst the permission bits and timestamps in st, like shutil.copystat."""
+    # The mode passed to os.open is filtered through the umask; set it exactly
+    os.chmod(dst, st.st_mode & 0o777)
+    os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+def _fast_copy(src, dst):
+    """
+    Copy src to dst without a user-space copy where possible, keeping src's mode and timestamps.
+    
+    Returns the number of bytes written, so callers need not stat dst again.
+    """
+    st = os.stat(src)
+    size = st.st_size
+    copied = 0
     
-    return found_template
+    src_fd = os.open(src, os.O_RDONLY | _O_BINARY)
+    try:
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | _O_BINARY, st.st_mode & 0o777)
+        try:
+            _fadvise(src_fd, 'POSIX_FADV_SEQUENTIAL')
+            _fadvise(dst_fd, 'POSIX_FADV_SEQUENTIAL')
+            
+            # Reserve the whole extent up front so the copy does not fragment it
+            preallocated = False
+            if size and hasattr(os, 'posix_fallocate'):
+                try:
+                    os.posix_fallocate(dst_fd, 0, size)
+                    preallocated = True
+                except OSError:
+                    pass
+            
+            # copy_file_range: in-kernel copy (a reflink on CoW filesystems)
+            try:
+                while copied < size:
+                    sent = os.copy_file_range(src_fd, dst_fd, size - copied)
+                    if sent == 0:
+                        break
+                    copied += sent
+            except (AttributeError, OSError):
+                pass
+            
+            # sendfile: in-kernel copy where copy_file_range is unsupported
+            try:
+                while copied < size:
+                    sent = os.sendfile(dst_fd, src_fd, None, size - copied)
+                    if sent == 0:
+                        break
+                    copied += sent
+            except (AttributeError, OSError):
+                # No os.sendfile on Windows
+                pass
+            
+            # Plain read/write loop as a last resort, reusing one buffer
+            if copied < size:
+                buf = bytearray(_COPY_BUFSIZE)
+                view = memoryview(buf)
+                with open(src_fd, 'rb', buffering=0, closefd=False) as src_file, \
+                        open(dst_fd, 'wb', buffering=0, closefd=False) as dst_file:
+                    while n := src_file.readinto(buf):
+                        dst_file.write(view[:n])
+                        copied += n
+            
+            if preallocated and copied < size:
+                # src shrank while copying; drop the unused reservation
+                os.ftruncate(dst_fd, copied)
+            
+            # The saved sheet is written once and read back much later; let the
+            # kernel drop whatever of it is already clean from the page cache
+            _fadvise(dst_fd, 'POSIX_FADV_DONTNEED')
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    
+    _copy_stat(st, dst)
+    return copied
 
+# ioctl(FICLONE) request from <linux/fs.h>
+_FICLONE = 0x40049409
+
+def _reflink(src, dst):
+    """
+    Clone src into a new dst sharing its extents copy-on-write (Btrfs, XFS).
+    
+    Returns the size, or None when the platform or filesystem cannot clone.
+    Unlike a hard link, dst is its own inode: later writes to src (cp over
+    the template, an editor saving in place) leave it untouched.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    
+    st = os.stat(src)
+    src_fd = os.open(src, os.O_RDONLY | _O_BINARY)
+    try:
+        dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | _O_BINARY, st.st_mode & 0o777)
+        try:
+            fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+        except OSError:
+            # EXDEV, EOPNOTSUPP, EINVAL: not the same CoW filesystem
+            return None
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    
+    _copy_stat(st, dst)
+    return st.st_size
+
+def _clone_or_copy(src, dst):
+    """
+    Reflink src to dst where the filesystem supports it, else copy it.
+    
+    The data lands in dst + '.tmp' and is renamed over dst only once complete,
+    so nothing watching the upload directory sees a partial sheet and an
+    existing dst is replaced rather than written through. Returns
+    (bytes, method). Never hard-links: the saved sheet must not change when
+    the template is overwritten in place.
+    """
+    tmp = dst + '.tmp'
+    try:
+        # Leftover from an interrupted save
+        os.unlink(tmp)
+    except FileNotFoundError:
+        pass
+    
+    try:
+        size = _reflink(src, tmp)
+        if size is not None:
+            result = size, 'reflink'
+        else:
+            result = _fast_copy(src, tmp), 'copy'
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        raise
+    
+    return result
+
+@_flush_log_after
 def save_bubble_sheet(template_file=None):
     """Save bubble sheet to upload directory."""
     
     if not template_file:
-        print("❌ No bubble sheet template found!")
-        print("💡 Please save your bubble sheet image as 'bubble_sheet_template.png'")
+        log.error("❌ No bubble sheet template found!")
+        log.info("💡 Please save your bubble sheet image as 'bubble_sheet_template.png'")
         return None
     
     # Create upload directory
@@ -90,92 +324,125 @@ def save_bubble_sheet(template_file=None):
     os.makedirs(upload_dir, exist_ok=True)
     
     # Create timestamped filename
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    timestamp = _timestamp()
     output_filename = f"bubble_sheet_template_{timestamp}.png"
     output_path = os.path.join(upload_dir, output_filename)
     
     # Copy the template file
-    import shutil
     try:
-        shutil.copy2(template_file, output_path)
-        file_size = os.path.getsize(output_path)
-        print(f"✅ Bubble sheet saved: {output_path} ({file_size:,} bytes)")
+        file_size, method = _clone_or_copy(template_file, output_path)
+        log.info("✅ Bubble sheet saved: %s (%s bytes, %s)", output_path, format(file_size, ","), method)
         return output_path
     except Exception as e:
-        print(f"❌ Failed to save bubble sheet: {e}")
+        log.error("❌ Failed to save bubble sheet: %s", e)
         return None
 
+@_flush_log_after
 def download_image_from_url(url):
     """Download image from URL."""
     
     try:
+        # Imported here rather than at the top: urllib.request pulls in
+        # http.client, ssl and email, and only --url needs them
         import urllib.request
-        from urllib.parse import urlparse
         
-        print(f"📥 Downloading image from: {url}")
+        log.info("📥 Downloading image from: %s", url)
         
         # Parse URL to get filename
         parsed = urlparse(url)
-        filename = os.path.basename(parsed.path) or "downloaded_bubble_sheet.png"
+        filename = parsed.path.rpartition('/')[2] or "downloaded_bubble_sheet.png"
         
         # Ensure it has an image extension
-        if not filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
+        _, dot, extension = filename.rpartition('.')
+        if not dot or extension.lower() not in _IMAGE_EXTENSIONS:
             filename += '.png'
         
-        # Download the file
-        urllib.request.urlretrieve(url, filename)
+        # Download the file, streaming through one reusable 1 MiB buffer
+        # (urlretrieve reads in 8 KiB blocks)
+        request = urllib.request.Request(url, headers={'Accept-Encoding': 'identity'})
+        with urllib.request.urlopen(request) as response, open(filename, 'wb') as f:
+            buf = bytearray(_COPY_BUFSIZE)
+            view = memoryview(buf)
+            while n := response.readinto(buf):
+                f.write(view[:n])
         
         if os.path.exists(filename):
-            print(f"✅ Downloaded: {filename}")
+            log.info("✅ Downloaded: %s", filename)
             return filename
         else:
-            print(f"❌ Download failed")
+            log.error("❌ Download failed")
             return None
             
     except Exception as e:
-        print(f"❌ Download error: {e}")
+        log.error("❌ Download error: %s", e)
         return None
 
+def _run_quiet(cmd):
+    """
+    Run cmd with its output discarded and return the exit code.
+    
+    Uses posix_spawnp (vfork + exec, no page-table copy) where available;
+    a command that is not installed yields 127 like in a shell.
+    """
+    if not hasattr(os, 'posix_spawnp'):
+        # Windows and other platforms without posix_spawn
+        try:
+            return subprocess.run(cmd, capture_output=True).returncode
+        except FileNotFoundError:
+            return 127
+    
+    file_actions = [
+        (os.POSIX_SPAWN_OPEN, 1, os.devnull, os.O_WRONLY, 0),
+        (os.POSIX_SPAWN_OPEN, 2, os.devnull, os.O_WRONLY, 0),
+    ]
+    try:
+        pid = os.posix_spawnp(cmd[0], cmd, os.environ, file_actions=file_actions)
+    except FileNotFoundError:
+        return 127
+    except NotImplementedError:
+        return subprocess.run(cmd, capture_output=True).returncode
+    
+    _, status = os.waitpid(pid, 0)
+    return os.waitstatus_to_exitcode(status)
+
+# lpr if installed (command -v is a builtin, so a missing lpr costs no exec),
+# then lp in place of the shell
+_PRINT_CHAIN = 'if command -v lpr >/dev/null; then lpr "$1" && exit 0; fi; exec lp "$1"'
+
+@_flush_log_after
 def print_bubble_sheet(image_path):
     """Send bubble sheet to printer."""
     
     if not image_path or not os.path.exists(image_path):
-        print("❌ Cannot print: image file not found")
+        log.error("❌ Cannot print: image file not found")
         return False
     
-    print(f"🖨️  Printing bubble sheet...")
+    log.info("🖨️  Printing bubble sheet...")
     
     try:
-        # Try different printing methods
-        
-        # Method 1: Using lpr (Linux/Unix standard)
-        import subprocess
-        result = subprocess.run(['lpr', image_path], capture_output=True, text=True)
-        if result.returncode == 0:
-            print("✅ Sent to printer using lpr")
-            return True
-        
-        # Method 2: Using lp command
-        result = subprocess.run(['lp', image_path], capture_output=True, text=True)
-        if result.returncode == 0:
-            print("✅ Sent to printer using lp")
+        # Method 1: lpr (Linux/Unix standard), falling back to lp, in one spawn
+        if _run_quiet(['sh', '-c', _PRINT_CHAIN, '_', image_path]) == 0:
+            log.info("✅ Sent to printer using lpr/lp")
             return True
         
-        # Method 3: Show available options
-        print("🔧 Direct printing failed. Alternative options:")
-        print(f"   1. Manual: Open {image_path} and print from image viewer")
-        print(f"   2. Command: lpr {image_path}")
-        print(f"   3. Command: lp {image_path}")
+        # Method 2: Show available options
+        log.info("🔧 Direct printing failed. Alternative options:")
+        log.info("   1. Manual: Open %s and print from image viewer", image_path)
+        log.info("   2. Command: lpr %s", image_path)
+        log.info("   3. Command: lp %s", image_path)
         
         return False
         
     except Exception as e:
-        print(f"❌ Print error: {e}")
-        print(f"💡 Manual printing: Open {image_path} in image viewer and print")
+        log.error("❌ Print error: %s", e)
+        log.info("💡 Manual printing: Open %s in image viewer and print", image_path)
         return False
 
-def main():
-    """Main function."""
+def parse_args(argv):
+    """Parse the command line options."""
+    
+    # Imported here so that library users of this module don't pay for it
+    import argparse
     
     parser = argparse.ArgumentParser(description='Save and print bubble sheet template')
     parser.add_argument('--save-only', action='store_true', help='Only save, do not print')
@@ -184,10 +451,16 @@ def main():
     parser.add_argument('--url', '-u', type=str, help='URL to download bubble sheet image')
     parser.add_argument('image_path', nargs='?', help='Path to bubble sheet image (positional argument)')
     
-    args = parser.parse_args()
+    return parser.parse_args(argv)
+
+@_flush_log_after
+def main():
+    """Main function."""
+    
+    args = parse_args(sys.argv[1:])
     
-    print("📄 Bubble Sheet Template Manager")
-    print("=" * 40)
+    log.info("📄 Bubble Sheet Template Manager")
+    log.info("=" * 40)
     
     # Step 1: Determine image source
     template_file = None
@@ -195,15 +468,15 @@ def main():
     # Priority order: command line args > positional arg > auto-detect
     if args.image:
         template_file = args.image
-        print(f"📁 Using image from --image: {template_file}")
+        log.info("📁 Using image from --image: %s", template_file)
     elif args.image_path:
         template_file = args.image_path
-        print(f"📁 Using image from argument: {template_file}")
+        log.info("📁 Using image from argument: %s", template_file)
     elif args.url:
         # Download from URL
         template_file = download_image_from_url(args.url)
         if template_file:
-            print(f"📥 Downloaded image from URL: {template_file}")
+            log.info("📥 Downloaded image from URL: %s", template_file)
     else:
         # Auto-detect existing template files
         template_file = create_bubble_sheet_image()
@@ -211,19 +484,19 @@ def main():
     # Validate the image file exists
     if not template_file or not os.path.exists(template_file):
         if args.image or args.image_path:
-            print(f"❌ Image file not found: {template_file}")
+            log.error("❌ Image file not found: %s", template_file)
             return 1
         
-        print("\n⚠️  No bubble sheet template found!")
-        print("📥 You can provide an image in several ways:")
-        print("   • python print_bubble_sheet.py /path/to/image.png")
-        print("   • python print_bubble_sheet.py --image /path/to/image.png")
-        print("   • python print_bubble_sheet.py --url http://example.com/image.png")
-        print("   • Save image as 'bubble_sheet_template.png' in current directory")
-        print("\n💡 Example: python print_bubble_sheet.py ~/Downloads/bubble_sheet.png --print")
+        log.warning("\n⚠️  No bubble sheet template found!")
+        log.info("📥 You can provide an image in several ways:")
+        log.info("   • python print_bubble_sheet.py /path/to/image.png")
+        log.info("   • python print_bubble_sheet.py --image /path/to/image.png")
+        log.info("   • python print_bubble_sheet.py --url http://example.com/image.png")
+        log.info("   • Save image as 'bubble_sheet_template.png' in current directory")
+        log.info("\n💡 Example: python print_bubble_sheet.py ~/Downloads/bubble_sheet.png --print")
         return 1
     
-    print(f"✅ Found template: {template_file}")
+    log.info("✅ Found template: %s", template_file)
     
     # Step 2: Save the template
     saved_path = save_bubble_sheet(template_file)
@@ -237,11 +510,12 @@ def main():
         action = 'print'
     else:
         # Interactive mode
-        print(f"\n📋 What would you like to do?")
-        print(f"1. Save only (for scanner testing)")
-        print(f"2. Save and print (to create physical copy)")
-        print(f"3. Exit")
+        log.info("\n📋 What would you like to do?")
+        log.info("1. Save only (for scanner testing)")
+        log.info("2. Save and print (to create physical copy)")
+        log.info("3. Exit")
         
+        _log_handler.flush()
         choice = input("\nEnter choice (1-3): ").strip()
         
         if choice == '1':
@@ -249,25 +523,25 @@ def main():
         elif choice == '2':
             action = 'print'
         else:
-            print("👋 Exiting...")
+            log.info("👋 Exiting...")
             return 0
     
     # Step 4: Execute action
     if action == 'print':
-        print(f"\n🖨️  Printing bubble sheet...")
+        log.info("\n🖨️  Printing bubble sheet...")
         success = print_bubble_sheet(saved_path)
         if success:
-            print(f"✅ Bubble sheet sent to printer!")
+            log.info("✅ Bubble sheet sent to printer!")
         else:
-            print(f"⚠️  Auto-print failed, but file is saved for manual printing")
+            log.warning("⚠️  Auto-print failed, but file is saved for manual printing")
     
     # Step 5: Final instructions
-    print(f"\n📂 File saved at: {saved_path}")
-    print(f"🔬 Ready for scanner testing!")
-    print(f"💡 You can now:")
-    print(f"   • Print this file and use it with your scanner")
-    print(f"   • Run: python test_scanner.py")
-    print(f"   • Use the printed sheet for bubble sheet processing tests")
+    log.info("\n📂 File saved at: %s", saved_path)
+    log.info("🔬 Ready for scanner testing!")
+    log.info("💡 You can now:")
+    log.info("   • Print this file and use it with your scanner")
+    log.info("   • Run: python test_scanner.py")
+    log.info("   • Use the printed sheet for bubble sheet processing tests")
     
     return 0
 
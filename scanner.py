@@ -13,10 +13,169 @@ Author: Ahmed
 Date: 2025-08-10
 """
 
+import atexit
+import logging
+import os
 import sane
 import sys
+import threading
+import time
 from typing import List, Tuple, Optional
 
+logger = logging.getLogger(__name__)
+
+# How long a SANE device enumeration (USB/network probing) stays valid
+DEVICES_CACHE_TTL = 5.0
+
+# (monotonic timestamp, devices) of the last sane.get_devices() call
+_devices_cache: Tuple[float, List[Tuple[str, str, str, str]]] = (0.0, [])
+
+# Source option values that select the flatbed, in order of preference
+FLATBED_SOURCE_NAMES = ['Flatbed', 'flatbed', 'Platen', 'platen', 'Scanner', 'scanner']
+
+# Lowercased flatbed names matched against the sources a backend lists
+FLATBED_CANDIDATES = ('flatbed', 'platen', 'scanner', 'document table')
+
+# Device options scan_document() configures when present
+SCAN_OPTIONS = ('source', 'resolution', 'mode', 'tl_x', 'tl_y', 'br_x', 'br_y')
+
+# Backend options reporting a page on the glass/feeder (python-sane spelling)
+PAPER_SENSOR_OPTIONS = ('paper_loaded', 'page_loaded', 'adf_loaded', 'document_loaded')
+
+# sane.init() loads the backend libraries; do it once per process
+_SANE_INITED = False
+_sane_init_lock = threading.Lock()
+
+# Seconds SANE callers wait for a running device prefetch
+PREFETCH_JOIN_TIMEOUT = 30.0
+
+# Background enumeration started by start_device_prefetch()
+_prefetch: Optional[threading.Thread] = None
+
+
+def _ensure_sane_init(announce: bool = True):
+    """Initialise SANE on first use and shut it down at interpreter exit."""
+    global _SANE_INITED
+    with _sane_init_lock:
+        if not _SANE_INITED:
+            sane.init()
+            _SANE_INITED = True
+            atexit.register(_sane_exit)
+            if announce:
+                logger.info("✅ SANE initialized successfully")
+
+
+def _wait_for_prefetch():
+    """
+    Join a running prefetch before touching SANE from another thread.
+    
+    SANE backends are not thread-safe, so nothing may open, enumerate or
+    shut down while the prefetch is inside sane.get_devices().
+    """
+    prefetch = _prefetch
+    if prefetch is not None and prefetch is not threading.current_thread() and prefetch.is_alive():
+        prefetch.join(PREFETCH_JOIN_TIMEOUT)
+
+
+def _sane_exit():
+    """sane.exit() at interpreter exit, once any prefetch has finished."""
+    _wait_for_prefetch()
+    if _prefetch is not None and _prefetch.is_alive():
+        # Still stuck in the backend; tearing it down underneath would crash
+        logger.debug("SANE device prefetch still running, skipping sane.exit()")
+        return
+    sane.exit()
+
+
+def _prefetch_devices():
+    """Enumerate devices in the background so the first list_scanners() finds them cached."""
+    try:
+        _ensure_sane_init(announce=False)
+        _get_devices(force_refresh=True)
+    except Exception as e:
+        logger.debug("SANE device prefetch failed: %s", e)
+
+
+def start_device_prefetch():
+    """
+    Start enumerating SANE devices on a background thread.
+    
+    Scripts call this first thing so the (multi-second) bus probe overlaps
+    their own setup; the first list_scanners() then joins it and finds the
+    devices cached. Importing this module does not start it. Does nothing
+    when a prefetch was already started or SANE_NO_PREFETCH=1.
+    """
+    global _prefetch
+    if _prefetch is not None or os.getenv("SANE_NO_PREFETCH") == "1":
+        return
+    _prefetch = threading.Thread(target=_prefetch_devices, name="sane-prefetch", daemon=True)
+    _prefetch.start()
+
+
+def _save_scan_image(image, output_path: str):
+    """
+    Save a PIL scan with fast encoder settings.
+    
+    Scans are transient test artifacts, so PNG uses zlib level 1 (the default
+    level 6 dominates save time for a 300 DPI page) and JPEG quality 85 4:2:0.
+    """
+    extension = output_path.lower().rpartition('.')[2]
+    if extension in ('jpg', 'jpeg'):
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.save(output_path, 'JPEG', quality=85, subsampling=2)
+    elif extension == 'png':
+        image.save(output_path, 'PNG', compress_level=1, optimize=False)
+    else:
+        image.save(output_path)
+
+
+# SANE_CAP_INACTIVE bit of an option's capabilities (sane/sane.h)
+SANE_CAP_INACTIVE = 32
+
+
+def _option_active(option) -> bool:
+    """Whether a python-sane Option is currently settable (not SANE_CAP_INACTIVE)."""
+    is_active = getattr(option, 'is_active', None)
+    if callable(is_active):
+        return bool(is_active())
+    return not (getattr(option, 'cap', 0) or 0) & SANE_CAP_INACTIVE
+
+
+def _option_constraints(device) -> Optional[dict]:
+    """
+    {option name: constraint} of an open python-sane device's active options,
+    from one descriptor fetch.
+    
+    Uses the option table python-sane builds at open time, else a single
+    get_options() call; None if the device cannot list its options. Inactive
+    options are left out, as hasattr() on the device is False for them too.
+    """
+    options = getattr(device, 'opt', None)
+    if options:
+        return {name: getattr(option, 'constraint', None)
+                for name, option in options.items() if _option_active(option)}
+    
+    try:
+        # (index, name, title, desc, type, unit, size, cap, constraint)
+        return {option[1].replace('-', '_'): option[8]
+                for option in device.get_options()
+                if option and option[1] and not (option[7] or 0) & SANE_CAP_INACTIVE}
+    except Exception:
+        return None
+
+
+def _get_devices(force_refresh: bool = False) -> List[Tuple[str, str, str, str]]:
+    """sane.get_devices(), reused for DEVICES_CACHE_TTL seconds unless force_refresh."""
+    global _devices_cache
+    _wait_for_prefetch()
+    
+    fetched_at, devices = _devices_cache
+    if force_refresh or not fetched_at or time.monotonic() - fetched_at >= DEVICES_CACHE_TTL:
+        devices = sane.get_devices()
+        _devices_cache = (time.monotonic(), devices)
+    return devices
+
 class ScannerConnection:
     """
     Simple class to manage scanner device connection only.
@@ -27,49 +186,82 @@ class ScannerConnection:
         self.scanner = None
         self.scanner_name = None
         self.is_connected = False
+        self._caps = {}
+        # Holders sharing this connection through get_scanner(); 0 = not shared
+        self._refs = 0
         
         # Initialize SANE
         try:
-            sane.init()
-            print("✅ SANE initialized successfully")
+            _ensure_sane_init()
         except Exception as e:
-            print(f"❌ Failed to initialize SANE: {e}")
+            logger.error("❌ Failed to initialize SANE: %s", e)
             raise
     
-    def list_scanners(self) -> List[Tuple[str, str, str, str]]:
+    def list_scanners(self, force_refresh: bool = False) -> List[Tuple[str, str, str, str]]:
         """
         Get a list of available scanner devices.
         
+        Args:
+            force_refresh: Re-probe devices even if a recent enumeration is cached
+            
         Returns:
             List of tuples (device_name, vendor, model, type)
         """
         try:
-            devices = sane.get_devices()
-            print(f"📋 Found {len(devices)} scanner devices")
+            devices = _get_devices(force_refresh)
+            logger.info("📋 Found %s scanner devices", len(devices))
             
             for i, device in enumerate(devices):
-                print(f"  Device {i+1}: {device}")
+                logger.info("  Device %s: %s", i + 1, device)
             
             return devices
         except Exception as e:
-            print(f"❌ Error listing scanners: {e}")
+            logger.error("❌ Error listing scanners: %s", e)
             return []
     
-    def connect_scanner(self, device_name: Optional[str] = None) -> bool:
+    def connect_scanner(self, device_name: Optional[str] = None,
+                        devices: Optional[List[Tuple[str, str, str, str]]] = None) -> bool:
         """
         Connect to a scanner device.
         
         Args:
             device_name: Specific device name to connect to. If None, connects to first available.
+            devices: Device list the caller already fetched with list_scanners(), to skip probing again
             
         Returns:
             True if connection successful, False otherwise
         """
         try:
-            devices = self.list_scanners()
+            # A full device name can be opened without probing the bus first
+            if device_name:
+                handle = None
+                try:
+                    _wait_for_prefetch()
+                    handle = sane.open(device_name)
+                    self.scanner = handle
+                    self.scanner_name = device_name
+                    self.is_connected = True
+                    logger.info("✅ Connected to scanner: %s", self.scanner_name)
+                    self._probe_capabilities()
+                    return True
+                except Exception:
+                    # Not an exact device name, or probing failed; release the
+                    # handle before matching against the device list
+                    if handle is not None:
+                        try:
+                            handle.close()
+                        except Exception:
+                            pass
+                        self.scanner = None
+                        self.scanner_name = None
+                        self.is_connected = False
+                        self._caps = {}
+            
+            if devices is None:
+                devices = self.list_scanners()
             
             if not devices:
-                print("❌ No scanner devices found")
+                logger.error("❌ No scanner devices found")
                 return False
             
             # Use specified device or first available
@@ -81,7 +273,7 @@ class ScannerConnection:
                         break
                 
                 if not target_device:
-                    print(f"❌ Scanner device '{device_name}' not found")
+                    logger.error("❌ Scanner device '%s' not found", device_name)
                     return False
                 
                 self.scanner_name = target_device[0]
@@ -92,14 +284,103 @@ class ScannerConnection:
             self.scanner = sane.open(self.scanner_name)
             self.is_connected = True
             
-            print(f"✅ Connected to scanner: {self.scanner_name}")
+            logger.info("✅ Connected to scanner: %s", self.scanner_name)
+            self._probe_capabilities()
             return True
             
         except Exception as e:
-            print(f"❌ Failed to connect to scanner: {e}")
+            logger.error("❌ Failed to connect to scanner: %s", e)
             self.is_connected = False
             return False
     
+    def _probe_capabilities(self):
+        """
+        Work out once per connection which options the device has.
+        
+        Every attribute touch on a python-sane device is a SANE control-option
+        round-trip (slow over eSCL/USB), so scan_document() works from this
+        snapshot instead of re-probing and retrying source names per scan.
+        """
+        scanner = self.scanner
+        constraints = _option_constraints(scanner)
+        
+        def has_option(name):
+            return name in constraints if constraints is not None else hasattr(scanner, name)
+        
+        def option_max(name):
+            # Range constraints are (min, max, quant)
+            constraint = (constraints or {}).get(name)
+            if isinstance(constraint, tuple) and len(constraint) >= 2:
+                return constraint[1]
+            return None
+        
+        caps = {name: has_option(name) for name in SCAN_OPTIONS}
+        caps['flatbed_name'] = None
+        caps['br_max'] = None
+        caps['paper_sensor'] = next((name for name in PAPER_SENSOR_OPTIONS
+                                     if constraints is not None and name in constraints), None)
+        
+        # IMPORTANT: Force flatbed source instead of document feeder
+        # This fixes "Document feeder out of documents" error
+        if caps['source']:
+            try:
+                # Both reads are device round-trips; only pay for them when shown
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("🔍 Current scan source: %s", getattr(scanner, 'source', None))
+                    
+                    if hasattr(scanner, 'get_parameters'):
+                        try:
+                            logger.debug("📋 Available scanner parameters: %s", scanner.get_parameters())
+                        except:
+                            pass
+                
+                # Only try names the device lists, when it lists them, matched
+                # case-insensitively and written in the backend's own casing
+                sources = (constraints or {}).get('source')
+                if isinstance(sources, list):
+                    available_lower = {str(source).lower(): source for source in sources}
+                    candidates = [available_lower[name] for name in FLATBED_CANDIDATES
+                                  if name in available_lower]
+                else:
+                    candidates = FLATBED_SOURCE_NAMES
+                for flatbed_name in candidates:
+                    try:
+                        scanner.source = flatbed_name
+                        caps['flatbed_name'] = flatbed_name
+                        logger.debug("✅ Scan source set to: %s", flatbed_name)
+                        break
+                    except Exception as e:
+                        logger.warning("⚠️ Could not set source to %s: %s", flatbed_name, e)
+            except Exception as e:
+                logger.warning("⚠️ Could not configure scan source: %s", e)
+                logger.debug("📝 Continuing with default source...")
+        
+        # Full flatbed scan area (this can help force flatbed mode). Without a
+        # range constraint there is no known maximum, and reading the current
+        # value only to write it back would be a wasted round-trip
+        if caps['br_x'] and caps['br_y']:
+            br_max = (option_max('br_x'), option_max('br_y'))
+            if None not in br_max:
+                caps['br_max'] = br_max
+        
+        self._caps = caps
+    
+    def paper_loaded(self) -> Optional[bool]:
+        """
+        Ask the device's paper sensor whether a page is loaded.
+        
+        Returns:
+            True/False from the sensor, or None if the device has no such option
+        """
+        sensor = self._caps.get('paper_sensor')
+        if not self.is_connected or not sensor:
+            return None
+        try:
+            return bool(getattr(self.scanner, sensor))
+        except Exception as e:
+            logger.warning("⚠️ Could not read %s: %s", sensor, e)
+            return None
+    
     def get_scanner_info(self) -> dict:
         """
         Get basic information about the connected scanner.
@@ -108,7 +389,7 @@ class ScannerConnection:
             Dictionary with scanner information
         """
         if not self.is_connected or not self.scanner:
-            print("❌ No scanner connected")
+            logger.error("❌ No scanner connected")
             return {}
         
         try:
@@ -131,7 +412,7 @@ class ScannerConnection:
             return info
             
         except Exception as e:
-            print(f"❌ Error getting scanner info: {e}")
+            logger.error("❌ Error getting scanner info: %s", e)
             return {
                 'name': self.scanner_name,
                 'connected': self.is_connected
@@ -150,141 +431,61 @@ class ScannerConnection:
             True if scan successful, False otherwise
         """
         if not self.is_connected or not self.scanner:
-            print("❌ No scanner connected")
+            logger.error("❌ No scanner connected")
             return False
         
         try:
             # Set scan parameters
-            print(f"🔧 Setting scan parameters: {resolution} DPI, {mode} mode")
+            logger.debug("🔧 Setting scan parameters: %s DPI, %s mode", resolution, mode)
             
-            # IMPORTANT: Force flatbed source instead of document feeder
-            # This fixes "Document feeder out of documents" error
-            if hasattr(self.scanner, 'source'):
-                try:
-                    # Try common flatbed source names
-                    flatbed_names = ['Flatbed', 'flatbed', 'Platen', 'platen', 'Scanner', 'scanner']
-                    current_source = getattr(self.scanner, 'source', None)
-                    print(f"🔍 Current scan source: {current_source}")
-                    
-                    # Get available sources
-                    if hasattr(self.scanner, 'get_parameters'):
-                        try:
-                            params = self.scanner.get_parameters()
-                            print(f"📋 Available scanner parameters: {params}")
-                        except:
-                            pass
-                    
-                    # Try to set flatbed source
-                    for flatbed_name in flatbed_names:
-                        try:
-                            self.scanner.source = flatbed_name
-                            print(f"✅ Scan source set to: {flatbed_name}")
-                            break
-                        except Exception as e:
-                            print(f"⚠️ Could not set source to {flatbed_name}: {e}")
-                            continue
-                    
-                except Exception as e:
-                    print(f"⚠️ Could not configure scan source: {e}")
-                    print("📝 Continuing with default source...")
+            caps = self._caps
             
             # Set resolution if supported
-            if hasattr(self.scanner, 'resolution'):
+            if caps.get('resolution'):
                 self.scanner.resolution = resolution
-                print(f"✅ Resolution set to {resolution} DPI")
+                logger.debug("✅ Resolution set to %s DPI", resolution)
             
             # Set scan mode if supported
-            if hasattr(self.scanner, 'mode'):
+            if caps.get('mode'):
                 self.scanner.mode = mode
-                print(f"✅ Scan mode set to {mode}")
+                logger.debug("✅ Scan mode set to %s", mode)
             
-            print("📷 Starting scan...")
+            logger.debug("📷 Starting scan...")
             
-            # Additional flatbed enforcement before scan
+            # Flatbed enforcement before scan, using the source found at connect time
             try:
-                # Force flatbed one more time before scanning
-                if hasattr(self.scanner, 'source'):
-                    self.scanner.source = 'Flatbed'
-                    print(f"🔒 Final source confirmation: {self.scanner.source}")
+                if caps.get('flatbed_name'):
+                    self.scanner.source = caps['flatbed_name']
+                    logger.debug("🔒 Final source confirmation: %s", caps['flatbed_name'])
                     
                 # Set scan area to full flatbed (this can help force flatbed mode)
-                if hasattr(self.scanner, 'tl_x'):
+                if caps.get('tl_x'):
                     self.scanner.tl_x = 0.0
-                if hasattr(self.scanner, 'tl_y'):
+                if caps.get('tl_y'):
                     self.scanner.tl_y = 0.0
-                if hasattr(self.scanner, 'br_x') and hasattr(self.scanner, 'br_y'):
-                    # Use reasonable A4 size or scanner max
-                    try:
-                        # Get scanner max dimensions
-                        max_x = getattr(self.scanner, 'br_x', 215.0)
-                        max_y = getattr(self.scanner, 'br_y', 297.0)
-                        self.scanner.br_x = max_x
-                        self.scanner.br_y = max_y
-                        print(f"📐 Scan area set: (0,0) to ({max_x},{max_y})mm")
-                    except:
-                        pass
+                if caps.get('br_max'):
+                    max_x, max_y = caps['br_max']
+                    self.scanner.br_x = max_x
+                    self.scanner.br_y = max_y
+                    logger.debug("📐 Scan area set: (0,0) to (%s,%s)mm", max_x, max_y)
                         
             except Exception as e:
-                print(f"⚠️ Pre-scan configuration warning: {e}")
-            
-            # Try multiple scan approaches to avoid document feeder issues
-            scan_success = False
-            last_error = None
+                logger.warning("⚠️ Pre-scan configuration warning: %s", e)
             
-            # Approach 1: Normal scan with flatbed enforcement
+            # Start the scan. A document-feeder failure gets one retry with the
+            # flatbed source re-selected; reopening the device costs seconds
+            # over eSCL and does not help, so other errors fail straight away
+            logger.debug("🎯 Starting scan with flatbed enforcement...")
             try:
-                print("🎯 Attempting scan approach 1: Normal with flatbed enforcement...")
                 self.scanner.start()
-                scan_success = True
-            except Exception as e1:
-                last_error = str(e1)
-                print(f"❌ Scan approach 1 failed: {e1}")
-                
-                # Approach 2: Reset scanner and try again with different settings
-                try:
-                    print("🎯 Attempting scan approach 2: Reset and retry...")
-                    # Close and reopen scanner connection
-                    temp_name = self.scanner_name
-                    self.scanner.close()
-                    self.scanner = sane.open(temp_name)
-                    
-                    # Reapply settings
-                    if hasattr(self.scanner, 'source'):
-                        self.scanner.source = 'Flatbed'
-                    if hasattr(self.scanner, 'resolution'):
-                        self.scanner.resolution = resolution
-                    if hasattr(self.scanner, 'mode'):
-                        self.scanner.mode = mode
-                    
-                    # Try scan again
-                    self.scanner.start()
-                    scan_success = True
-                    print("✅ Scan approach 2 succeeded!")
-                except Exception as e2:
-                    last_error = str(e2)
-                    print(f"❌ Scan approach 2 failed: {e2}")
-                    
-                    # Approach 3: Try with minimal settings
-                    try:
-                        print("🎯 Attempting scan approach 3: Minimal settings...")
-                        # Close and reopen again
-                        temp_name = self.scanner_name
-                        self.scanner.close()
-                        self.scanner = sane.open(temp_name)
-                        
-                        # Set only essential settings
-                        if hasattr(self.scanner, 'source'):
-                            self.scanner.source = 'Flatbed'
-                            
-                        self.scanner.start()
-                        scan_success = True
-                        print("✅ Scan approach 3 succeeded!")
-                    except Exception as e3:
-                        last_error = str(e3)
-                        print(f"❌ Scan approach 3 failed: {e3}")
-            
-            if not scan_success:
-                raise Exception(f"All scan approaches failed. Last error: {last_error}")
+            except Exception as e:
+                message = str(e).lower()
+                if not caps.get('flatbed_name') or ('feeder' not in message and 'adf' not in message):
+                    raise
+                logger.warning("⚠️ Scan hit the document feeder (%s), retrying on %s...", e, caps['flatbed_name'])
+                self.scanner.source = caps['flatbed_name']
+                self.scanner.start()
+                logger.debug("✅ Retry succeeded!")
             
             # Get the scanned image
             image = self.scanner.snap()
@@ -292,7 +493,7 @@ class ScannerConnection:
             # Save the image
             if hasattr(image, 'save'):
                 # PIL Image object
-                image.save(output_path)
+                _save_scan_image(image, output_path)
             else:
                 # NumPy array - convert to PIL Image
                 from PIL import Image as PILImage
@@ -300,32 +501,38 @@ class ScannerConnection:
                 
                 if isinstance(image, np.ndarray):
                     pil_image = PILImage.fromarray(image)
-                    pil_image.save(output_path)
+                    _save_scan_image(pil_image, output_path)
                 else:
                     # Try to save directly
                     with open(output_path, 'wb') as f:
                         f.write(image)
             
-            print(f"✅ Document scanned and saved to: {output_path}")
+            logger.info("✅ Document scanned and saved to: %s", output_path)
             return True
             
         except Exception as e:
-            print(f"❌ Error during scanning: {e}")
+            logger.error("❌ Error during scanning: %s", e)
             return False
     
     def disconnect(self):
-        """Disconnect from the scanner and cleanup."""
+        """Disconnect from the scanner and cleanup (a shared connection only drops one reference)."""
+        if self._refs > 1:
+            self._refs -= 1
+            return
+        self._refs = 0
+        
         try:
             if self.scanner:
                 self.scanner.close()
-                print("✅ Scanner disconnected")
+                logger.info("✅ Scanner disconnected")
             
             self.scanner = None
             self.scanner_name = None
             self.is_connected = False
+            self._caps = {}
             
         except Exception as e:
-            print(f"❌ Error disconnecting scanner: {e}")
+            logger.error("❌ Error disconnecting scanner: %s", e)
     
     def __del__(self):
         """Cleanup when object is destroyed."""
@@ -333,23 +540,72 @@ class ScannerConnection:
 
 
 # Convenience function
-def connect_to_scanner(device_name: Optional[str] = None) -> Optional[ScannerConnection]:
+def connect_to_scanner(device_name: Optional[str] = None,
+                       devices: Optional[List[Tuple[str, str, str, str]]] = None) -> Optional[ScannerConnection]:
     """
     Simple function to connect to a scanner device.
     
     Args:
         device_name: Specific scanner to connect to (optional)
+        devices: Already-fetched device list to pick from (optional)
         
     Returns:
         ScannerConnection object if successful, None otherwise
     """
-    conn = ScannerConnection()
+    return get_scanner(device_name, devices)
+
+
+# Connection shared by get_scanner() callers, kept open between them
+_SCANNER_SINGLETON: Optional[ScannerConnection] = None
+
+
+def get_scanner(device_name: Optional[str] = None,
+                devices: Optional[List[Tuple[str, str, str, str]]] = None) -> Optional[ScannerConnection]:
+    """
+    Shared, reference-counted scanner connection.
     
-    if conn.connect_scanner(device_name):
-        return conn
-    else:
+    Opening a device (enumeration plus sane.open) can take seconds over eSCL,
+    so the handle is opened once and handed out again to later callers.
+    disconnect() drops the caller's reference; the module keeps its own and
+    closes the device at interpreter exit.
+    
+    Args:
+        device_name: Specific scanner to connect to (optional)
+        devices: Already-fetched device list to pick from (optional)
+        
+    Returns:
+        ScannerConnection object if successful, None otherwise
+    """
+    global _SCANNER_SINGLETON
+    shared = _SCANNER_SINGLETON
+    if shared is not None and shared.is_connected and (not device_name or device_name in shared.scanner_name):
+        shared._refs += 1
+        return shared
+    
+    conn = ScannerConnection()
+    if not conn.connect_scanner(device_name, devices):
         conn.disconnect()
         return None
+    
+    if shared is None:
+        # Registered after _sane_exit, so it runs first at exit
+        atexit.register(_close_shared_scanner)
+    else:
+        # Another device was asked for; release the module's hold on the old one
+        shared.disconnect()
+    
+    conn._refs = 2  # the module's reference plus the caller's
+    _SCANNER_SINGLETON = conn
+    return conn
+
+
+def _close_shared_scanner():
+    """Close the shared connection regardless of outstanding references."""
+    global _SCANNER_SINGLETON
+    if _SCANNER_SINGLETON is not None:
+        _SCANNER_SINGLETON._refs = 0
+        _SCANNER_SINGLETON.disconnect()
+        _SCANNER_SINGLETON = None
 
 
 def list_available_scanners() -> List[Tuple[str, str, str, str]]:
@@ -359,14 +615,20 @@ def list_available_scanners() -> List[Tuple[str, str, str, str]]:
     Returns:
         List of available scanner devices
     """
-    conn = ScannerConnection()
-    devices = conn.list_scanners()
-    del conn
-    return devices
+    _ensure_sane_init()
+    try:
+        devices = _get_devices()
+        logger.info("📋 Found %s scanner devices", len(devices))
+        return devices
+    except Exception as e:
+        logger.error("❌ Error listing scanners: %s", e)
+        return []
 
 
 # Example usage
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+    
     print("Scanner Connection Test")
     print("=" * 30)
     
@@ -385,7 +647,7 @@ if __name__ == "__main__":
         
         # Connect to first available scanner
         print("\nConnecting to scanner...")
-        connection = connect_to_scanner()
+        connection = connect_to_scanner(devices=devices)
         
         if connection:
             print("\n✅ Successfully connected to scanner!")
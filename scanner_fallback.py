@@ -9,11 +9,41 @@ to avoid eSCL protocol issues with Canon TS3400.
 This bypasses python-sane and uses the scanimage CLI directly.
 """
 
+import collections
+import logging
+import re
 import subprocess
 import os
+import shutil
 import sys
+import threading
 from typing import Optional, List, Tuple
 
+logger = logging.getLogger(__name__)
+
+# One `scanimage -L` line, e.g.
+# device `escl:https://192.168.114.1:443' is a Canon TS3400 series platen scanner
+_DEVICE_LINE_RE = re.compile(r"device `([^']*)'?(?: is a (\S+)(?:\s+(.*\S))?)?")
+
+# Seconds a single scanimage run may take
+SCAN_TIMEOUT = 60
+
+# Pipe/copy buffer for streaming scanimage output to disk
+SCAN_PIPE_BUFSIZE = 1 << 20
+
+# stderr lines kept for the error message of a failed scan
+SCAN_STDERR_TAIL = 64
+
+# scanimage --format values, by output file extension
+SCAN_FORMATS = {
+    '.png': 'png',
+    '.jpg': 'jpeg',
+    '.jpeg': 'jpeg',
+    '.tif': 'tiff',
+    '.tiff': 'tiff',
+    '.pnm': 'pnm',
+}
+
 class ScannerCommandLine:
     """Scanner using direct scanimage command."""
     
@@ -24,54 +54,59 @@ class ScannerCommandLine:
     def list_scanners(self) -> List[Tuple[str, str, str, str]]:
         """List available scanners using scanimage -L"""
         try:
-            print("📡 Scanning for devices using scanimage...")
+            logger.info("📡 Scanning for devices using scanimage...")
             result = subprocess.run(['scanimage', '-L'], 
                                   capture_output=True, text=True, timeout=10)
             
             if result.returncode != 0:
-                print(f"❌ scanimage command failed: {result.stderr}")
+                logger.error("❌ scanimage command failed: %s", result.stderr)
                 return []
             
-            devices = []
-            lines = result.stdout.strip().split('\n')
-            
-            print(f"📋 Found {len(lines)} scanner devices:")
-            for i, line in enumerate(lines):
-                if 'device `' in line:
-                    # Parse: device `escl:https://192.168.114.1:443' is a Canon TS3400 series platen scanner
-                    device_start = line.find('`') + 1
-                    device_end = line.find("'", device_start)
-                    device_name = line[device_start:device_end] if device_end > device_start else line[device_start:-1]
-                    
-                    # Extract vendor/model info
-                    info_part = line.split(' is a ')[-1] if ' is a ' in line else 'Unknown'
-                    parts = info_part.split()
-                    vendor = parts[0] if parts else 'Unknown'
-                    model = ' '.join(parts[1:]) if len(parts) > 1 else 'Unknown'
-                    
-                    device_tuple = (device_name, vendor, model, 'scanner')
-                    devices.append(device_tuple)
-                    print(f"  Device {i+1}: {device_tuple}")
-            
-            return devices
+            return self._parse_devices(result.stdout)
             
         except subprocess.TimeoutExpired:
-            print("❌ Scanner detection timed out")
+            logger.error("❌ Scanner detection timed out")
             return []
         except FileNotFoundError:
-            print("❌ scanimage command not found. Install: sudo apt-get install sane-utils")
+            logger.error("❌ scanimage command not found. Install: sudo apt-get install sane-utils")
             return []
         except Exception as e:
-            print(f"❌ Error listing scanners: {e}")
+            logger.error("❌ Error listing scanners: %s", e)
             return []
     
-    def connect_scanner(self, device_name: Optional[str] = None) -> bool:
-        """Connect to scanner (just store device name)"""
+    def _parse_devices(self, output: str) -> List[Tuple[str, str, str, str]]:
+        """Parse `scanimage -L` output into (device_name, vendor, model, type) tuples."""
+        devices = []
+        lines = output.strip().split('\n')
+        
+        logger.info("📋 Found %s scanner devices:", len(lines))
+        for i, line in enumerate(lines):
+            match = _DEVICE_LINE_RE.search(line)
+            if match:
+                device_name, vendor, model = match.groups()
+                device_tuple = (device_name, vendor or 'Unknown', model or 'Unknown', 'scanner')
+                devices.append(device_tuple)
+                logger.info("  Device %s: %s", i + 1, device_tuple)
+        
+        return devices
+    
+    def connect_scanner(self, device_name: Optional[str] = None,
+                        devices: Optional[List[Tuple[str, str, str, str]]] = None) -> bool:
+        """Connect to scanner (just store device name), reusing a device list the caller already has"""
         try:
-            devices = self.list_scanners()
+            # A full SANE device name (backend:device) needs no scanimage -L
+            # probe; scanimage reports it at scan time if it is wrong
+            if device_name and devices is None and ':' in device_name:
+                self.device_name = device_name
+                self.is_connected = True
+                logger.info("✅ Connected to scanner: %s", self.device_name)
+                return True
+            
+            if devices is None:
+                devices = self.list_scanners()
             
             if not devices:
-                print("❌ No scanner devices found")
+                logger.error("❌ No scanner devices found")
                 return False
             
             # Use specified device or first available
@@ -83,7 +118,7 @@ class ScannerCommandLine:
                         break
                 
                 if not target_device:
-                    print(f"❌ Scanner device '{device_name}' not found")
+                    logger.error("❌ Scanner device '%s' not found", device_name)
                     return False
                 
                 self.device_name = target_device[0]
@@ -91,35 +126,45 @@ class ScannerCommandLine:
                 self.device_name = devices[0][0]
             
             self.is_connected = True
-            print(f"✅ Connected to scanner: {self.device_name}")
+            logger.info("✅ Connected to scanner: %s", self.device_name)
             return True
             
         except Exception as e:
-            print(f"❌ Failed to connect to scanner: {e}")
+            logger.error("❌ Failed to connect to scanner: %s", e)
             self.is_connected = False
             return False
     
-    def scan_document(self, output_path: str, resolution: int = 300, mode: str = 'Color') -> bool:
-        """Scan document using scanimage command"""
+    def scan_document(self, output_path: str, resolution: int = 300, mode: str = 'Color',
+                      image_format: Optional[str] = None) -> bool:
+        """
+        Scan document using scanimage command.
+        
+        image_format is a scanimage --format value; by default it follows the
+        output_path extension, and is JPEG for Color/Gray scans otherwise
+        (libjpeg encodes far faster than libpng's deflate), PNG for Lineart.
+        """
         if not self.is_connected or not self.device_name:
-            print("❌ No scanner connected")
+            logger.error("❌ No scanner connected")
             return False
         
         try:
-            print(f"📄 Scanning document with scanimage...")
-            print(f"🔧 Parameters: {resolution} DPI, {mode} mode")
+            logger.debug("📄 Scanning document with scanimage...")
+            logger.debug("🔧 Parameters: %s DPI, %s mode", resolution, mode)
+            
+            mode_lower = mode.lower()
+            if image_format is None:
+                extension = os.path.splitext(output_path)[1].lower()
+                image_format = SCAN_FORMATS.get(extension) or ('jpeg' if mode_lower in ('color', 'gray') else 'png')
             
             # Build scanimage command
             cmd = [
                 'scanimage',
                 '--device-name', self.device_name,
                 '--resolution', str(resolution),
-                '--format', 'png',
-                '--output-file', output_path
+                '--format', image_format,
             ]
             
             # Set mode
-            mode_lower = mode.lower()
             if mode_lower == 'color':
                 cmd.extend(['--mode', 'Color'])
             elif mode_lower == 'gray':
@@ -130,31 +175,90 @@ class ScannerCommandLine:
             # Force flatbed source
             cmd.extend(['--source', 'Flatbed'])
             
-            print(f"🚀 Running: {' '.join(cmd)}")
+            logger.debug("🚀 Running: %s > %s", ' '.join(cmd), output_path)
             
-            # Execute scan command
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+            # Execute scan command, streaming the image from stdout to disk
+            # while scanimage is still producing it
+            returncode, stderr = self._run_scan(cmd, output_path)
             
-            if result.returncode == 0:
-                if os.path.exists(output_path):
-                    file_size = os.path.getsize(output_path)
-                    print(f"✅ Document scanned successfully: {output_path} ({file_size} bytes)")
-                    return True
-                else:
-                    print(f"❌ Scan completed but file not found: {output_path}")
+            if returncode == 0:
+                try:
+                    file_size = os.stat(output_path).st_size
+                except FileNotFoundError:
+                    logger.error("❌ Scan completed but file not found: %s", output_path)
                     return False
+                logger.info("✅ Document scanned successfully: %s (%s bytes)", output_path, file_size)
+                return True
             else:
-                print(f"❌ Scan failed: {result.stderr}")
-                print(f"📝 Command output: {result.stdout}")
+                logger.error("❌ Scan failed: %s", stderr)
                 return False
                 
         except subprocess.TimeoutExpired:
-            print("❌ Scan timed out (60 seconds)")
+            logger.error("❌ Scan timed out (%s seconds)", SCAN_TIMEOUT)
             return False
         except Exception as e:
-            print(f"❌ Error during scanning: {e}")
+            logger.error("❌ Error during scanning: %s", e)
             return False
     
+    def _run_scan(self, cmd: List[str], output_path: str) -> Tuple[int, str]:
+        """
+        Run scanimage with its image on stdout copied to output_path as it arrives.
+        
+        Returns (returncode, stderr). Raises subprocess.TimeoutExpired if the
+        scan takes longer than SCAN_TIMEOUT; a failed scan leaves no file behind.
+        """
+        timed_out = threading.Event()
+        stderr_tail = collections.deque(maxlen=SCAN_STDERR_TAIL)
+        
+        def drain_stderr():
+            # Keep memory bounded however chatty the backend is, logging as it goes
+            for raw_line in process.stderr:
+                line = raw_line.decode(errors='replace').rstrip()
+                logger.debug("scanimage: %s", line)
+                stderr_tail.append(line)
+        
+        try:
+            with open(output_path, 'wb') as f:
+                process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                           bufsize=SCAN_PIPE_BUFSIZE)
+                
+                def kill():
+                    timed_out.set()
+                    process.kill()
+                
+                # The limit has to hold while streaming, not only at wait()
+                watchdog = threading.Timer(SCAN_TIMEOUT, kill)
+                stderr_reader = threading.Thread(target=drain_stderr, daemon=True)
+                watchdog.start()
+                stderr_reader.start()
+                try:
+                    shutil.copyfileobj(process.stdout, f, SCAN_PIPE_BUFSIZE)
+                    returncode = process.wait()
+                except BaseException:
+                    # Writing failed (ENOSPC, EIO) or we were interrupted; nobody
+                    # reads stdout any more, so scanimage would block on it forever
+                    process.kill()
+                    process.wait()
+                    raise
+                finally:
+                    watchdog.cancel()
+                    stderr_reader.join()
+                    process.stdout.close()
+                    process.stderr.close()
+        except BaseException:
+            try:
+                os.remove(output_path)
+            except FileNotFoundError:
+                pass
+            raise
+        
+        if returncode != 0:
+            os.remove(output_path)
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(cmd, SCAN_TIMEOUT)
+        
+        return returncode, '\n'.join(stderr_tail)
+    
     def get_scanner_info(self) -> dict:
         """Get basic scanner info"""
         return {
@@ -167,7 +271,7 @@ class ScannerCommandLine:
         """Disconnect (cleanup)"""
         self.device_name = None
         self.is_connected = False
-        print("✅ Scanner disconnected")
+        logger.info("✅ Scanner disconnected")
 
 # Drop-in replacement functions
 def connect_to_scanner_cli(device_name: Optional[str] = None) -> Optional[ScannerCommandLine]:
@@ -179,6 +283,8 @@ def connect_to_scanner_cli(device_name: Optional[str] = None) -> Optional[Scanne
         return None
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+    
     print("Scanner Command Line Test")
     print("=" * 30)
     
@@ -9,35 +9,154 @@ by properly configuring your Canon TS3400 scanner to use the flatbed.
 Run this before using the exam scanner functionality.
 """
 
-import sane
+import atexit
+import json
+import logging
+import os
 import sys
+import tempfile
+import time
 from typing import Dict, List
 
-def test_scanner_sources():
-    """Test and configure scanner sources to avoid feeder errors."""
+# Device list and per-device working source, shared between runs of this tool:
+# {"devices": [...], "probed_at": <epoch>, "sources": {device_name: source}}
+CACHE_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+    "fingerprint-backend", "sane_devices.json")
+
+# Flatbed source names in preference order, lowercased for matching against
+# the sources a backend lists (never a feeder: that is what this tool avoids)
+FLATBED_CANDIDATES = ('flatbed', 'platen', 'scanner', 'document table')
+
+# Names tried blindly when the backend does not list its sources
+FLATBED_GUESSES = ('Flatbed', 'flatbed', 'Platen', 'platen')
+
+_sane_ready = False
+
+def _init_sane():
+    """
+    Import and initialise SANE once per process, returning the module.
+    
+    The bindings are only loaded when a live probe or open is needed, so a
+    cached device list costs no backend start-up.
+    """
+    global _sane_ready
+    import sane
+    if not _sane_ready:
+        sane.init()
+        atexit.register(sane.exit)
+        _sane_ready = True
+        print("✅ SANE initialized successfully")
+    return sane
+
+def _load_cache() -> Dict:
+    """Cache file contents, or {} if it is missing or unreadable."""
+    try:
+        with open(CACHE_PATH, encoding="utf-8") as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def _save_cache(cache: Dict):
+    """Write the cache file atomically; a failure only costs the next run a re-probe."""
+    try:
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(CACHE_PATH), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+        os.replace(tmp, CACHE_PATH)
+    except OSError as e:
+        print(f"⚠️  Could not write device cache: {e}")
+
+def _write_lines(lines: List[str]):
+    """Emit a whole report section with one stdout write."""
+    sys.stdout.write("\n".join(lines) + "\n")
+
+def get_devices_cached(max_age: float = 60, flush: bool = False) -> List:
+    """
+    sane.get_devices(), reusing the result of a run less than max_age seconds ago.
+    
+    The USB/network bus walk behind get_devices() is the slowest step of this
+    tool; flush=True (--flush-cache) forces a fresh probe after hardware changes.
+    """
+    cache = _load_cache()
+    if not flush and time.time() - cache.get("probed_at", 0) <= max_age:
+        devices = cache.get("devices")
+        if devices:
+            print("⚡ Using cached device list (--flush-cache to re-probe)")
+            return [tuple(device) for device in devices]
+    
+    sane = _init_sane()
+    devices = sane.get_devices()
+    cache["devices"] = [list(device) for device in devices]
+    cache["probed_at"] = time.time()
+    _save_cache(cache)
+    return devices
+
+def _remember_source(device_name: str, source: str = None):
+    """Record (or with source=None, forget) the working source for device_name."""
+    cache = _load_cache()
+    sources = cache.setdefault("sources", {})
+    if source is None:
+        if sources.pop(device_name, None) is None:
+            return
+    elif sources.get(device_name) == source:
+        return
+    else:
+        sources[device_name] = source
+    _save_cache(cache)
+
+def snapshot_scanner(scanner) -> Dict[str, Dict]:
+    """
+    {option name: {'descriptor': ..., 'value': ...}} from one get_options() pass.
+    
+    Every option read is a control_option round-trip to the device, so each
+    value is read exactly once here and shared by everything that reports on
+    or chooses from the options. Unreadable options (groups, buttons,
+    inactive settings) get a value of None.
+    """
+    snapshot = {}
+    # (index, name, title, desc, type, unit, size, cap, constraint)
+    for descriptor in scanner.get_options():
+        if not descriptor or not descriptor[1]:
+            continue
+        name = descriptor[1].replace('-', '_')
+        try:
+            value = getattr(scanner, name)
+        except Exception:
+            value = None
+        snapshot[name] = {'descriptor': descriptor, 'value': value}
+    return snapshot
+
+def test_scanner_sources(flush_cache: bool = False):
+    """
+    Test and configure scanner sources to avoid feeder errors.
+    
+    Returns (ok, scanner). On success the SANE handle is left open, already
+    set to the flatbed source, and the caller must close() it.
+    """
     
     print("🔍 Scanner Source Configuration Test")
     print("=" * 40)
     
+    scanner = None
     try:
-        # Initialize SANE
-        sane.init()
-        print("✅ SANE initialized successfully")
-        
         # Get available devices
-        devices = sane.get_devices()
+        devices = get_devices_cached(flush=flush_cache)
         if not devices:
             print("❌ No scanner devices found")
-            return False
+            return False, None
         
-        print(f"\n📋 Found {len(devices)} scanner devices:")
-        for i, device in enumerate(devices):
-            print(f"  {i+1}. {device}")
+        out = [f"\n📋 Found {len(devices)} scanner devices:"]
+        out.extend(f"  {i+1}. {device}" for i, device in enumerate(devices))
+        _write_lines(out)
         
         # Connect to first device (usually the Canon TS3400)
         device_name = devices[0][0]
         print(f"\n🔌 Connecting to: {device_name}")
         
+        sane = _init_sane()
         scanner = sane.open(device_name)
         print("✅ Scanner connected successfully")
         
@@ -45,64 +164,96 @@ def test_scanner_sources():
         print(f"\n📊 Scanner Options and Current Values:")
         print("-" * 40)
         
+        # Read every option once; the report and source selection share it
+        try:
+            snapshot = snapshot_scanner(scanner)
+        except Exception as e:
+            print(f"⚠️  Could not list scanner options: {e}")
+            snapshot = {}
+        
         # Check for source option
         source_found = False
+        sources_known = False
         available_sources = []
         current_source = None
         
-        try:
-            # Try to get current source
-            if hasattr(scanner, 'source'):
-                current_source = scanner.source
-                source_found = True
-                print(f"📍 Current Source: {current_source}")
-                
-                # Try to get available source options
-                try:
-                    # Some SANE backends provide constraint information
-                    source_info = scanner.get_option_descriptor('source')
-                    if source_info and source_info[8]:  # constraint list
-                        available_sources = list(source_info[8])
-                        print(f"📝 Available Sources: {available_sources}")
-                    else:
-                        # Common sources for Canon scanners
-                        available_sources = ['Flatbed', 'Document Feeder', 'Platen']
-                        print(f"📝 Trying common sources: {available_sources}")
-                except Exception as e:
-                    print(f"⚠️  Could not get source constraints: {e}")
-                    # Default to common Canon scanner sources
-                    available_sources = ['Flatbed', 'Document Feeder', 'Platen']
+        source_option = snapshot.get('source')
+        if source_option:
+            current_source = source_option['value']
+            source_found = True
+            print(f"📍 Current Source: {current_source}")
+            
+            # Some SANE backends provide constraint information
+            constraint = source_option['descriptor'][8]
+            if isinstance(constraint, list) and constraint:
+                available_sources = list(constraint)
+                sources_known = True
+                print(f"📝 Available Sources: {available_sources}")
             else:
-                print("❌ Scanner does not have 'source' option")
-        except Exception as e:
-            print(f"❌ Error checking source: {e}")
+                # Common sources for Canon scanners
+                available_sources = ['Flatbed', 'Document Feeder', 'Platen']
+                print(f"📝 Trying common sources: {available_sources}")
+        else:
+            print("❌ Scanner does not have 'source' option")
         
         # Show all available scanner options
-        print(f"\n🔧 All Scanner Parameters:")
-        print("-" * 30)
-        
-        for attr_name in dir(scanner):
-            if not attr_name.startswith('_') and not callable(getattr(scanner, attr_name)):
-                try:
-                    value = getattr(scanner, attr_name)
-                    print(f"  {attr_name}: {value}")
-                except:
-                    print(f"  {attr_name}: <unable to read>")
+        out = [f"\n🔧 All Scanner Parameters:", "-" * 30]
+        for name, option in snapshot.items():
+            value = option['value']
+            out.append(f"  {name}: {value if value is not None else '<unable to read>'}")
+        _write_lines(out)
         
         # Test setting flatbed source
         if source_found and available_sources:
             print(f"\n🎯 Testing Source Configuration:")
             print("-" * 35)
             
-            # Try different flatbed names
-            flatbed_options = [
-                'Flatbed', 'flatbed', 'Platen', 'platen', 
-                'Scanner', 'scanner', 'Document Table', 'Automatic Document Feeder'
-            ]
-            
             success_source = None
-            for source_name in flatbed_options:
-                if source_name in available_sources or not available_sources:
+            
+            # A source that worked on an earlier run needs one write and readback
+            cached_source = _load_cache().get("sources", {}).get(device_name)
+            if cached_source:
+                try:
+                    print(f"  Cached: {cached_source}...", end=" ")
+                    scanner.source = cached_source
+                    current_test = scanner.source
+                    if current_test == cached_source:
+                        print("✅ SUCCESS")
+                        success_source = cached_source
+                    else:
+                        print(f"⚠️  Set but got: {current_test}")
+                except Exception as e:
+                    print(f"❌ Failed: {e}")
+                if not success_source:
+                    # Firmware or backend changed: drop it and probe again
+                    _remember_source(device_name, None)
+            
+            if success_source:
+                pass
+            elif sources_known:
+                # The backend told us its sources: only its flatbed names are
+                # written (in its own casing), most preferred first, each with
+                # one write and readback
+                available_lower = {a.lower(): a for a in available_sources}
+                matches = [available_lower[c] for c in FLATBED_CANDIDATES if c in available_lower]
+                if not matches:
+                    print(f"  No flatbed name among available sources")
+                for source_name in matches:
+                    try:
+                        print(f"  Setting: {source_name}...", end=" ")
+                        scanner.source = source_name
+                        current_test = scanner.source
+                        if current_test == source_name:
+                            print("✅ SUCCESS")
+                            success_source = source_name
+                            break
+                        else:
+                            print(f"⚠️  Set but got: {current_test}")
+                    except Exception as e:
+                        print(f"❌ Failed: {e}")
+            else:
+                # Unknown constraints: trial-and-error is the only option
+                for source_name in FLATBED_GUESSES:
                     try:
                         print(f"  Testing: {source_name}...", end=" ")
                         scanner.source = source_name
@@ -115,26 +266,25 @@ def test_scanner_sources():
                             print(f"⚠️  Set but got: {current_test}")
                     except Exception as e:
                         print(f"❌ Failed: {e}")
-                else:
-                    print(f"  Skipping: {source_name} (not in available sources)")
             
             if success_source:
+                _remember_source(device_name, success_source)
                 print(f"\n🎉 Successfully configured scanner to use: {success_source}")
                 print(f"✅ This should prevent 'Document feeder out of documents' error")
                 
                 # Try a test scan configuration
                 print(f"\n🧪 Testing scan configuration...")
                 try:
-                    if hasattr(scanner, 'resolution'):
+                    if 'resolution' in snapshot:
                         scanner.resolution = 300
                         print("✅ Resolution set to 300 DPI")
                     
-                    if hasattr(scanner, 'mode'):
+                    if 'mode' in snapshot:
                         scanner.mode = 'Color'
                         print("✅ Mode set to Color")
                     
                     print("✅ Scanner is ready for scanning!")
-                    print(f"   Source: {scanner.source}")
+                    print(f"   Source: {success_source}")
                     print(f"   Resolution: {getattr(scanner, 'resolution', 'Unknown')}")
                     print(f"   Mode: {getattr(scanner, 'mode', 'Unknown')}")
                     
@@ -145,40 +295,56 @@ def test_scanner_sources():
                 print(f"Available sources: {available_sources}")
                 print(f"You may need to manually place document on flatbed")
         
-        # Cleanup
-        scanner.close()
         print(f"\n✅ Scanner test completed successfully!")
-        return True
+        return True, scanner
         
     except Exception as e:
+        if scanner is not None:
+            try:
+                scanner.close()
+            except Exception:
+                pass
+
         print(f"\n❌ Scanner test failed: {e}")
         print(f"\nTroubleshooting:")
         print(f"1. Make sure scanner is powered on and connected")
         print(f"2. Check SANE installation: scanimage -L")
         print(f"3. Test manual scan: scanimage > test.pnm")
-        return False
+        return False, None
+    finally:
+        sys.stdout.flush()
 
-def quick_scan_test():
-    """Perform a quick scan test to verify configuration."""
+def quick_scan_test(scanner=None):
+    """
+    Perform a quick scan test to verify configuration.
+    
+    Reuses an open SANE handle when given one (the caller keeps ownership);
+    otherwise connects through scanner.py and disconnects afterwards.
+    """
     print(f"\n🚀 Quick Scan Test")
     print("=" * 20)
     
     try:
-        from scanner import connect_to_scanner
-        
-        scanner = connect_to_scanner()
-        if not scanner:
-            print("❌ Could not connect to scanner")
-            return False
-        
-        print("✅ Connected to scanner")
+        if scanner is None:
+            from scanner import connect_to_scanner
+            
+            connection = connect_to_scanner()
+            if not connection:
+                print("❌ Could not connect to scanner")
+                return False
+            
+            print("✅ Connected to scanner")
+        else:
+            connection = None
+            print("✅ Reusing open scanner")
         
         # Test scan (without actually scanning)
         print("📋 Scanner ready for document scanning")
         print("   Place your document on the flatbed (not in the feeder)")
         print("   The scanner should now work without 'feeder out of documents' error")
         
-        scanner.disconnect()
+        if connection is not None:
+            connection.disconnect()
         return True
         
     except Exception as e:
@@ -186,15 +352,21 @@ def quick_scan_test():
         return False
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+    
     print("Canon TS3400 Scanner Configuration Tool")
     print("=" * 45)
     print("This tool will help fix the 'Document feeder out of documents' error")
     print()
     
     # Run the source configuration test
-    if test_scanner_sources():
-        print("\n" + "=" * 50)
-        quick_scan_test()
+    ok, scanner = test_scanner_sources(flush_cache='--flush-cache' in sys.argv[1:])
+    if ok:
+        try:
+            print("\n" + "=" * 50)
+            quick_scan_test(scanner)
+        finally:
+            scanner.close()
         
         print(f"\n🎯 Next Steps:")
         print(f"1. ✅ Your scanner is now configured to use flatbed")
@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+from app.utils.student_id_detector import (
+    _read_gray,
+    detect_student_id,
+    detect_student_id_adaptive,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUDENT_SOLUTIONS = os.path.join(ROOT, "upload", "student_solutions")
+
+# A real scan whose adaptive grid has no clearly filled cell in some
+# columns, and a sheet whose ID region binarizes to a uniformly dark block
+# that used to read as "00000"
+SCANNED_SHEET = os.path.join(STUDENT_SOLUTIONS, "test_scan_gray_300dpi_20250810_141527.png")
+HIGHLIGHTED_SHEET = os.path.join(ROOT, "BubbleSheetCorrecterModule", "highlighted_bubbles.jpg")
+
+
+@pytest.mark.parametrize("image_path", [SCANNED_SHEET, HIGHLIGHTED_SHEET])
+def test_adaptive_rejects_fits_without_a_clear_answer_per_column(image_path):
+    result = detect_student_id_adaptive(image_path)
+
+    assert result["student_id"] is None
+    assert result["debug_info"]["method"] == "adaptive"
+
+
+def test_adaptive_accepts_gray_instead_of_path():
+    gray = _read_gray(SCANNED_SHEET)
+
+    assert detect_student_id_adaptive(None, gray=gray) == detect_student_id_adaptive(SCANNED_SHEET)
+
+
+def test_uniform_id_region_falls_through_to_generic_detection():
+    result = detect_student_id(HIGHLIGHTED_SHEET)
+
+    assert result["student_id"] != "00000"
+    assert result["debug_info"].get("method") != "adaptive"